@@ -0,0 +1,104 @@
+import hmac
+from datetime import datetime
+from flask import (
+    Blueprint,
+    Response,
+    abort,
+    current_app,
+    jsonify,
+    request,
+    send_from_directory,
+    stream_with_context
+    )
+from cache import fragment_cache, page_cache, value_cache
+from database import pool_stats
+from instrumentation import route_stats
+from profiling import list_profiles, make_token, profile_dir, PROFILE_ID
+import export as catalogue_export
+
+#operational endpoints (cache, pool and database statistics, profiles,
+#exports). Every request needs the X-Admin-Token header to match
+#ADMIN_TOKEN, debug mode or not, and without an ADMIN_TOKEN they
+#aren't registered at all.
+admin = Blueprint('admin', __name__, url_prefix='/admin')
+
+
+@admin.before_request
+def require_token():
+    token = current_app.config.get('ADMIN_TOKEN')
+    given = request.headers.get('X-Admin-Token', '')
+    if not token or not hmac.compare_digest(given.encode(), token.encode()):
+        abort(404)
+
+
+@admin.route('/cache')
+def cache_stats():
+    stats = page_cache.stats()
+    stats['values'] = value_cache.stats()
+    stats['fragments'] = fragment_cache.stats()
+    stats['templates'] = current_app.extensions.get('template_warmup')
+    return jsonify(stats)
+
+
+@admin.route('/pool')
+def pool():
+    #checked out connections etc. of the worker that answers, ask a
+    #few times to see the others
+    return jsonify(pool_stats())
+
+
+@admin.route('/sql', methods=['GET', 'DELETE'])
+def sql_stats():
+    #statements and database time per endpoint since the worker
+    #started (or the last DELETE)
+    if request.method == 'DELETE':
+        route_stats.reset()
+    return jsonify(route_stats.snapshot())
+
+
+@admin.route('/profiles')
+def profiles():
+    #summaries of the stored request profiles, newest first
+    return jsonify(list_profiles(current_app))
+
+
+@admin.route('/profiles/token')
+def profile_token():
+    #send it as the X-Profile header to have a request profiled
+    token = make_token(current_app)
+    if token is None:
+        abort(404)
+    return jsonify({'header': 'X-Profile', 'token': token,
+                    'max_age': current_app.config['PROFILE_TOKEN_MAX_AGE']})
+
+
+@admin.route('/profiles/<profile_id>.<any(prof, json):format>')
+def profile(profile_id, format):
+    #the pstats dump (snakeviz, flameprof) or the summary of one profile
+    if not PROFILE_ID.fullmatch(profile_id):
+        abort(404)
+    return send_from_directory(profile_dir(current_app),
+                               '{}.{}'.format(profile_id, format),
+                               as_attachment=format == 'prof')
+
+
+@admin.route('/export/<kind>.<format>')
+def export(kind, format):
+    #same as `flask fyyur export`, ?since=2026-10-01T00:00:00 for an
+    #incremental export
+    if kind not in catalogue_export.COLUMNS or format not in catalogue_export.FORMATS:
+        abort(404)
+    since = request.args.get('since')
+    try:
+        since = datetime.fromisoformat(since) if since else None
+    except ValueError:
+        abort(400)
+    mimetype = 'text/csv' if format == 'csv' else 'application/x-ndjson'
+    return Response(
+        stream_with_context(catalogue_export.export(kind, format, since)),
+        mimetype=mimetype)
+
+
+def init_admin(app):
+    if app.config.get('ADMIN_TOKEN'):
+        app.register_blueprint(admin)
@@ -0,0 +1,188 @@
+import hashlib
+from datetime import datetime, timedelta
+from flask import Blueprint, abort, current_app, jsonify, request, url_for
+from models import db, Show, Venue, Artist
+from pagination import keyset_page
+from queries import calendar_filters, has_genre, parse_day, shows_between
+
+#versioned read-only JSON API.
+#
+#Every resource is built from a column-only projection and carries a
+#strong ETag and a Last-Modified header derived from updated_at. A
+#conditional GET for an unchanged resource is answered with a 304
+#right after a primary key lookup of updated_at, before the row is
+#loaded or anything is serialized. Collections only have an ETag (of
+#the ids and updated_at of their rows): no date tells that a row was
+#deleted from a page or moved off it.
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+FIELDS = {
+    Venue: [Venue.id, Venue.name, Venue.city, Venue.state, Venue.address,
+            Venue.phone, Venue.genres, Venue.image_link, Venue.facebook_link,
+            Venue.website_link, Venue.seeking_talent, Venue.seeking_description,
+            Venue.upcoming_shows_count, Venue.past_shows_count,
+            Venue.updated_at],
+    Artist: [Artist.id, Artist.name, Artist.city, Artist.state, Artist.phone,
+             Artist.genres, Artist.image_link, Artist.facebook_link,
+             Artist.website_link, Artist.seeking_venue,
+             Artist.seeking_description, Artist.upcoming_shows_count,
+             Artist.past_shows_count, Artist.updated_at],
+}
+
+SHOW_FIELDS = [
+    Show.id, Show.start_time, Show.end_time, Show.updated_at,
+    Show.venue_id, Venue.name.label('venue_name'),
+    Venue.updated_at.label('venue_updated_at'),
+    Show.artist_id, Artist.name.label('artist_name'),
+    Artist.image_link.label('artist_image_link'),
+    Artist.updated_at.label('artist_updated_at'),
+]
+
+MAX_LIMIT = 100
+
+
+def _serialize(row):
+    return {key: value.isoformat() if isinstance(value, datetime) else value
+            for key, value in row._asdict().items()}
+
+
+def _etag(*parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def _not_modified(etag, last_modified):
+    #the 304 for a conditional GET, or None when the client's copy is
+    #out of date (or it didn't send one)
+    if request.if_none_match:
+        if not request.if_none_match.contains_weak(etag):
+            return None
+    elif request.if_modified_since:
+        if last_modified is None or last_modified.replace(microsecond=0) > \
+                request.if_modified_since.replace(tzinfo=None):
+            return None
+    else:
+        return None
+    return _validators(current_app.response_class(status=304), etag,
+                       last_modified)
+
+
+def _validators(response, etag, last_modified):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    #clients must revalidate, the 304 keeps that cheap
+    response.cache_control.no_cache = True
+    return response
+
+
+def _limit():
+    #type=int would quietly fall back to the default for ?limit=abc
+    try:
+        limit = int(request.args.get('limit', 50))
+    except ValueError:
+        abort(400)
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def _collection(query, keys, item_etag):
+    page = keyset_page(query, keys, request.args.get('after'),
+                       request.args.get('before'), per_page=_limit())
+    versions = [item_etag(row) for row in page.items]
+    etag = _etag(request.full_path, versions)
+    not_modified = _not_modified(etag, None)
+    if not_modified is not None:
+        return not_modified
+
+    def link(**cursor):
+        return url_for(request.endpoint, _external=True, **cursor, **page.args)
+
+    response = jsonify({
+        'data': [_serialize(row) for row in page.items],
+        'next': link(after=page.next_cursor) if page.has_next else None,
+        'prev': link(before=page.prev_cursor) if page.has_prev else None,
+    })
+    return _validators(response, etag, None)
+
+
+def _resource(model, row_id):
+    #only updated_at first, the full row is read when it is needed
+    updated_at = db.session.query(model.updated_at).filter(
+        model.id == row_id).scalar()
+    if updated_at is None:
+        abort(404)
+    etag = _etag(model.__tablename__, row_id, updated_at)
+    not_modified = _not_modified(etag, updated_at)
+    if not_modified is not None:
+        return not_modified
+    row = db.session.query(*FIELDS[model]).filter(model.id == row_id).one()
+    return _validators(jsonify(_serialize(row)), etag, updated_at)
+
+
+def _show_rows():
+    return db.session.query(*SHOW_FIELDS).join(
+        Venue, Show.venue_id == Venue.id).join(
+        Artist, Show.artist_id == Artist.id)
+
+
+def _shows(query):
+    return _collection(query, [Show.start_time, Show.id], lambda row: (
+        row.id, row.updated_at, row.venue_updated_at, row.artist_updated_at))
+
+
+def _entities(model):
+    #?genre=Jazz narrows a collection down to one genre
+    query = db.session.query(*FIELDS[model])
+    genre = request.args.get('genre')
+    if genre:
+        query = query.filter(has_genre(model.genres, genre))
+    return _collection(query, [model.id], lambda row: (row.id, row.updated_at))
+
+
+@api.route('/venues')
+def venues():
+    return _entities(Venue)
+
+
+@api.route('/venues/<int:venue_id>')
+def venue(venue_id):
+    return _resource(Venue, venue_id)
+
+
+@api.route('/venues/<int:venue_id>/shows')
+def venue_shows(venue_id):
+    return _shows(_show_rows().filter(Show.venue_id == venue_id))
+
+
+@api.route('/artists')
+def artists():
+    return _entities(Artist)
+
+
+@api.route('/artists/<int:artist_id>')
+def artist(artist_id):
+    return _resource(Artist, artist_id)
+
+
+@api.route('/artists/<int:artist_id>/shows')
+def artist_shows(artist_id):
+    return _shows(_show_rows().filter(Show.artist_id == artist_id))
+
+
+@api.route('/shows')
+def shows():
+    return _shows(_show_rows())
+
+
+@api.route('/calendar')
+def calendar():
+    #shows with start <= start_time < end (YYYY-MM-DD, end defaults
+    #to a month after start), filtered by venue_id, artist_id, city,
+    #state and genre. Paged like the other collections.
+    start = parse_day(request.args.get('start'),
+                      datetime.combine(datetime.today(), datetime.min.time()))
+    end = parse_day(request.args.get('end'), start + timedelta(days=31))
+    if not start < end <= start + timedelta(
+            days=current_app.config['CALENDAR_MAX_DAYS']):
+        abort(400)
+    return _shows(shows_between(SHOW_FIELDS, start, end,
+                                **calendar_filters(request.args)))
@@ -5,6 +5,8 @@
 import json
 import dateutil.parser
 import babel
+import babel.dates
+from functools import lru_cache
 from flask_sqlalchemy import SQLAlchemy
 from flask import (
     Flask,
@@ -22,31 +24,84 @@ from flask_wtf import FlaskForm
 from flask_wtf.csrf import CSRFProtect
 from forms import *
 from flask_migrate import Migrate
-from datetime import datetime
+from datetime import datetime, timedelta
 from models import db, Show, Venue, Artist
+from queries import (venue_areas, artist_listing, show_listing, query_budget,
+  calendar_month, calendar_filters, genre_facets)
+from search import ranked_search
+from commands import fyyur_cli
+from loading import load_profile
+from cache import cached_page, add_cache_tags, invalidate, init_page_cache
+from admin import init_admin
+from api import api
+from database import configure_engine
+from schedule import show_end, find_conflict
+from dedupe import find_duplicates
+from instrumentation import init_sql_instrumentation
+from profiling import init_profiling
+from templating import init_templates, warm_templates
+from assets import init_assets
+from fragments import FragmentCacheExtension
+from thumbnails import init_thumbnails
 
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
 
 app = Flask(__name__)
-db.init_app(app)
 app.config.from_object('config')
+app.jinja_env.add_extension(FragmentCacheExtension)
+configure_engine(app)
+db.init_app(app)
 moment = Moment(app)
 migrate = Migrate(app, db, compare_type=True)
 csrf = CSRFProtect(app)
+app.cli.add_command(fyyur_cli)
+init_admin(app)
+app.register_blueprint(api)
+init_page_cache(app)
+init_sql_instrumentation(app)
+init_profiling(app)
+init_templates(app)
+init_assets(app)
+init_thumbnails(app)
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format, locale='en')
+DATETIME_FORMATS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma",
+}
+# babel's named formats, the ones not overridden above are babel's
+# own date and time patterns of the locale, not a pattern of their own
+BABEL_FORMATS = ('short', 'medium', 'long', 'full')
+
+# the compiled babel pattern and locale are looked up once per
+# format / locale instead of on every call
+@lru_cache(maxsize=None)
+def datetime_pattern(format):
+  return babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format))
+
+@lru_cache(maxsize=None)
+def babel_locale(locale):
+  return babel.Locale.parse(locale)
+
+# a page with hundreds of shows formats the same timestamps over and
+# over (and across requests), remember the formatted strings.
+@lru_cache(maxsize=8192)
+def format_datetime_cached(value, format, locale):
+  if format in BABEL_FORMATS and format not in DATETIME_FORMATS:
+      return babel.dates.format_datetime(value, format, locale=babel_locale(locale))
+  return datetime_pattern(format).apply(value, babel_locale(locale))
+
+def format_datetime(value, format='medium', locale='en'):
+  # the views pass datetime objects straight through, strings are
+  # still accepted but have to be parsed first.
+  if isinstance(value, str):
+      value = dateutil.parser.parse(value)
+  return format_datetime_cached(value, format, locale)
 
 app.jinja_env.filters['datetime'] = format_datetime
 
@@ -63,72 +118,62 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@cached_page('venues')
+@query_budget(2)
 def venues():
-  #TODO: Create an empty array
-  locals=[]
-  # TODO: store venue data in a variable
-  venues=Venue.query.all()
-  # TODO: Next we need to collect all combinations
-  # of city and state from the db. ALso we need to
-  # limit our results to a max of one city and state
-  # combination. Store results in another variable.
-  places= Venue.query.distinct(Venue.city, Venue.state).all()
-  # TODO: The query returns a list, therefor
-  # we can iterate over the list to efficiently
-  # build our objects that we will add to the locals list
-  for place in places:
-      #build and append each place obj
-      locals.append({
-        'city': place.city,
-        'state': place.state,
-        #we have access to venues because of the trailing
-        #for venue in venues
-        'venues': [{
-            'id': venue.id,
-            'name': venue.name,
-            #by utilizing the shows relationship on the venues
-            # table, we can retrieve all of the shows associated
-            # with a specific venue. Then we loop over each show
-            # and only return shows who's start time is greater
-            # then the current date and time
-            'num_upcoming_shows': len([
-            show for show in venue.shows
-            if show.start_time > datetime.now()])
-        } for venue in venues
-        if venue.city == place.city and venue.state == place.state]
-      })
-  return render_template('pages/venues.html', areas=locals);
+  # venue_areas runs a single query that returns every venue with
+  # its upcoming show counter, already sorted by city and state, so
+  # we no longer load every venue (and through the joined
+  # relationship every show) just to count in python.
+  # The listing is paged with a keyset cursor (see pagination.py),
+  # ?after=<cursor> and ?before=<cursor> move forward and back.
+  # ?genre=Jazz narrows it down to one genre, the genre facets
+  # (one aggregate query, cached until a venue changes) are the
+  # second query on the budget.
+  genre = request.args.get('genre')
+  page = venue_areas(request.args.get('after'), request.args.get('before'),
+    genre=genre)
+  # tag the cached page with every venue on it, so editing one of
+  # them drops this page as well (see cache.py)
+  add_cache_tags(*['venue:%d' % venue['id']
+    for area in page.items for venue in area['venues']])
+  return render_template('pages/venues.html', areas=page.items, page=page,
+    facets=genre_facets(Venue), genre=genre)
+
 @csrf.exempt
 @app.route('/venues/search', methods=['POST'])
 def search_venues():
   # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
   # seach for Hop should return "The Musical Hop".
   # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
-  count = 0
-  response = {}
-  data = []
-
-  search = request.form.get('search_term')
-  filtered_venues = Venue.query.filter(Venue.name.ilike(f'%{search}%')).all()
-  response['count'] = len(filtered_venues)
-  response['data'] = filtered_venues
-  return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
+  # ranked_search matches name, city, state and genres through the
+  # tsvector and trigram indexes (or an in-process index on sqlite)
+  search = request.form.get('search_term', '')
+  genre = request.form.get('genre')
+  data = ranked_search(Venue, search, genre=genre)
+  response = {'count': len(data), 'data': data}
+  return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''),
+    facets=genre_facets(Venue), genre=genre)
 
 @app.route('/venues/<int:venue_id>')
+@cached_page('venue:{venue_id}')
 def show_venue(venue_id):
   # TODO: Get venue data from db based on id
   # We need to take the existing venue data and
   # add two properties. Upcoming and past shows
   # each should have a list of shows in which the
   # start_time has already past or is upcoming
-  venue = Venue.query.get(venue_id)
+  # the detail profile loads the shows and their artists with
+  # two selectin/joined queries up front.
+  venue = Venue.query.options(
+    *load_profile(Venue, 'detail')).get(venue_id)
   #declare and set to empty list
   past_shows=[]
   upcoming_shows=[]
   # venue.shows is not a column but it is a relationship.
-  # Becuase we set lazy='joined' on our relationship key in
-  # our venue model, when we query our venue, we also recieve
-  # all relational data for that venue and the corresponding Shows.
+  # Becuase we asked for the detail loading profile, when we
+  # query our venue, we also recieve all relational data for
+  # that venue and the corresponding Shows.
   # loop over each show returned to us.
   for show in venue.shows:
       #build temp_show object with keys accesible by the
@@ -137,37 +182,47 @@ def show_venue(venue_id):
       #our query returned all shows related to our venue
       # and every show has a relationship to an artist.
       # This is how we are able to access artist.name
+      add_cache_tags('artist:%d' % show.artist_id)
       temp_show= {
+        'id': show.id,
         'artist_id': show.artist_id,
         'artist_name': show.artist.name,
         'artist_image_link': show.artist.image_link,
-        'start_time': show.start_time.strftime('%m/%d/%Y, %H:%M')
+        'start_time': show.start_time,
+        'updated_at': show.updated_at,
+        'artist_updated_at': show.artist.updated_at
       }
-      #compare start_time to current date and time,
-      #if it is less than or equal to, then the show
-      # has passed. Else the show has not started yet
-      if show.start_time <= datetime.now():
-          past_shows.append(temp_show)
-      else:
+      #is_upcoming says which counter the show is counted in
+      #(see counters.py), splitting on it keeps the lists in
+      #agreement with the counts until the next roll over.
+      if show.is_upcoming:
           upcoming_shows.append(temp_show)
+      else:
+          past_shows.append(temp_show)
 #vars is needed to assign the value of data to the
 #venue dictionary. This is how data gets all the venue
 # keys and values, much more effecient than how i did it
 # before
   data=vars(venue)
 #now that data has the venue data, we need to add
-#our past and upcoming shows list of objects as well
-# a past shows count and upcoming shows count.
+#our past and upcoming shows list of objects. The
+# past and upcoming shows counts are already columns.
   data['past_shows']=past_shows
   data['upcoming_shows']=upcoming_shows
-  data['past_shows_count']=len(past_shows)
-  data['upcoming_shows_count']=len(upcoming_shows)
 
   return render_template('pages/show_venue.html', venue=data)
 
 #  Create Venue
 #  ----------------------------------------------------------------
 
+def possible_duplicates(model, endpoint, key, name, city=None, state=None):
+  # the existing venues / artists a new one is probably a duplicate of,
+  # none once the user confirmed it isn't
+  if request.form.get('allow_duplicate'):
+      return []
+  return [{'name': row_name, 'url': url_for(endpoint, **{key: row_id})}
+    for row_id, row_name, _ in find_duplicates(model, name, city, state)]
+
 @app.route('/venues/create', methods=['GET'])
 def create_venue_form():
   form = VenueForm()
@@ -183,11 +238,21 @@ def create_venue_submission():
   # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
   form = VenueForm(request.form, meta={'csrf': False})
   if form.validate():
+      # near duplicates of the name in the same city (one trigram
+      # index lookup) are shown first, listing it anyway takes a
+      # second submit with allow_duplicate ticked.
+      duplicates = possible_duplicates(Venue, 'show_venue', 'venue_id',
+        form.name.data, form.city.data, form.state.data)
+      if duplicates:
+          return render_template('forms/new_venue.html',
+            form=VenueForm(request.form), duplicates=duplicates)
       try:
           venue = Venue()
           form.populate_obj(venue)
           db.session.add(venue)
           db.session.commit()
+          # the new venue can land on any page of the listing
+          invalidate('venues')
           flash('Venue ' + request.form['name'] + ' was successfully listed!')
 
       except ValueError:
@@ -211,6 +276,7 @@ def delete_venue(venue_id):
   try:
       deleteVenue= Venue.query.filter_by(id=venue_id).delete()
       db.session.commit()
+      invalidate('venue:%s' % venue_id, 'venues')
       return render_template('pages/home.html')
 
   except Exception as e:
@@ -227,52 +293,62 @@ def delete_venue(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@cached_page('artists')
+@query_budget(2)
 def artists():
-  # TODO: replace with real data returned from querying the database
-
-  data = Artist.query.all()
-
-  return render_template('pages/artists.html', artists=data)
+  # only id and name are needed for the listing, one page at a time,
+  # plus the cached genre facets
+  genre = request.args.get('genre')
+  page = artist_listing(request.args.get('after'), request.args.get('before'),
+    genre=genre)
+  add_cache_tags(*['artist:%d' % artist.id for artist in page.items])
+  return render_template('pages/artists.html', artists=page.items, page=page,
+    facets=genre_facets(Artist), genre=genre)
 @csrf.exempt
 @app.route('/artists/search', methods=['POST'])
 def search_artists():
   # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
   # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
   # search for "band" should return "The Wild Sax Band".
-  response = {}
-  search = request.form.get('search_term')
-  filtered_artists = Artist.query.filter(Artist.name.ilike(f'%{search}%')).all()
-  response['count'] = len(filtered_artists)
-  response['data'] = filtered_artists
-  return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
+  search = request.form.get('search_term', '')
+  genre = request.form.get('genre')
+  data = ranked_search(Artist, search, genre=genre)
+  response = {'count': len(data), 'data': data}
+  return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''),
+    facets=genre_facets(Artist), genre=genre)
 
 @app.route('/artists/<int:artist_id>')
+@cached_page('artist:{artist_id}')
 def show_artist(artist_id):
   # TODO: retrieve artist dictionary based on provided id.
   # build data obj with artist dictionary and build past and
   # upcoming shows list.
-  artist = Artist.query.get(artist_id)
+  artist = Artist.query.options(
+    *load_profile(Artist, 'detail')).get(artist_id)
   upcoming_shows=[]
   past_shows=[]
   #loop over each show related to artist
   for show in artist.shows:
   # build temp_show
+      add_cache_tags('venue:%d' % show.venue_id)
       temp_show={
         'venue_id': show.venue_id,
         'venue_name': show.venue.name,
         'venue_image_link': show.venue.image_link,
-        'start_time': show.start_time.strftime('%m/%d/%Y, %H:%M')
+        'start_time': show.start_time,
+        'id': show.id,
+        'updated_at': show.updated_at,
+        'venue_updated_at': show.venue.updated_at
       }
-      if show.start_time <= datetime.now():
-          past_shows.append(temp_show)
-      else:
+      if show.is_upcoming:
           upcoming_shows.append(temp_show)
+      else:
+          past_shows.append(temp_show)
 
+  # upcoming_shows_count and past_shows_count come with the artist
   data=vars(artist)
   data['upcoming_shows']=upcoming_shows
-  data['upcoming_shows_count']=len(upcoming_shows)
   data['past_shows']=past_shows
-  data['past_shows_count']=len(past_shows)
 
   return render_template('pages/show_artist.html', artist=data)
 
@@ -280,7 +356,8 @@ def show_artist(artist_id):
 #  ----------------------------------------------------------------
 @app.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
-  artist = Artist.query.get(artist_id)
+  artist = Artist.query.options(
+    *load_profile(Artist, 'listing')).get(artist_id)
   form = ArtistForm(obj=artist)
   # TODO: populate form with fields from artist with ID <artist_id>
   return render_template('forms/edit_artist.html', form=form, artist=artist)
@@ -292,7 +369,8 @@ def edit_artist_submission(artist_id):
   form=ArtistForm(request.form,meta={'csrf': False})
   if form.validate():
       try:
-          artist = Artist.query.get(artist_id)
+          artist = Artist.query.options(
+            *load_profile(Artist, 'listing')).get(artist_id)
           artist.name=form.name.data
           artist.city=form.city.data
           artist.state=form.state.data
@@ -304,6 +382,8 @@ def edit_artist_submission(artist_id):
           artist.seeking_venue=form.seeking_venue.data
           artist.seeking_description=form.seeking_description.data
           db.session.commit()
+          # a rename can move the artist to another listing page
+          invalidate('artist:%d' % artist_id, 'artists')
       except Exception as e:
           print(e)
           db.session.rollback()
@@ -318,7 +398,8 @@ def edit_artist_submission(artist_id):
 
 @app.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
-  venue = Venue.query.get(venue_id)
+  venue = Venue.query.options(
+    *load_profile(Venue, 'listing')).get(venue_id)
   form = VenueForm(obj=venue)
 
   # TODO: populate form with values from venue with ID <venue_id>
@@ -328,7 +409,8 @@ def edit_venue(venue_id):
 def edit_venue_submission(venue_id):
   # TODO: take values from the form submitted, and update existing
   # venue record with ID <venue_id> using the new attributes
-  venue=Venue.query.get(venue_id)
+  venue=Venue.query.options(
+    *load_profile(Venue, 'listing')).get(venue_id)
   form = VenueForm(request.form,meta={'csrf': False})
   if form.validate():
     try:
@@ -344,6 +426,7 @@ def edit_venue_submission(venue_id):
       venue.facebook_link = form.facebook_link.data
       venue.website_link = form.website_link.data
       db.session.commit()
+      invalidate('venue:%d' % venue_id, 'venues')
     except ValueError as e:
       db.session.rollback()
       print(e)
@@ -371,11 +454,17 @@ def create_artist_submission():
   # TODO: modify data to be the data object returned from db insertion
   form = ArtistForm(request.form, meta={'csrf': False})
   if form.validate():
+      duplicates = possible_duplicates(Artist, 'show_artist', 'artist_id',
+        form.name.data)
+      if duplicates:
+          return render_template('forms/new_artist.html',
+            form=ArtistForm(request.form), duplicates=duplicates)
       try:
           artist=Artist()
           form.populate_obj(artist)
           db.session.add(artist)
           db.session.commit()
+          invalidate('artists')
           # on successful db insert, flash success
           flash('Artist ' + request.form['name'] + ' was successfully listed!')
           # TODO: on unsuccessful db insert, flash an error instead.
@@ -398,25 +487,39 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@cached_page('shows')
+@query_budget(1)
 def shows():
   # displays list of shows at /shows
-  # TODO: replace with real venues data.
-  #       num_shows should be aggregated based on number of upcoming shows per venue.
-  shows = Show.query.all()
-  data= []
+  # show_listing joins show, venue and artist in one column-only
+  # query. query_budget makes the page fail loudly in debug mode if
+  # it ever goes back to one query per show.
+  page = show_listing(request.args.get('after'), request.args.get('before'))
+  for show in page.items:
+      add_cache_tags('venue:%d' % show['venue_id'],
+        'artist:%d' % show['artist_id'])
+  return render_template('pages/shows.html', shows=page.items, page=page)
+
+@app.route('/calendar')
+@cached_page('shows')
+@query_budget(1)
+def calendar():
+  # month view of the shows, ?month=YYYY-MM (this month by default)
+  # plus the same filters as /api/v1/calendar. One range query for
+  # the whole month, see calendar_month.
+  try:
+      month = datetime.strptime(request.args.get('month', ''), '%Y-%m')
+  except ValueError:
+      month = datetime.today().replace(day=1)
+  filters = calendar_filters(request.args)
+  weeks, shows, truncated = calendar_month(month.year, month.month, **filters)
   for show in shows:
-      venue=Venue.query.get(show.venue_id)
-      artist=Artist.query.get(show.artist_id)
-      data.append({
-        'venue_id': venue.id,
-        'venue_name': venue.name,
-        'artist_id': artist.id,
-        'artist_name': artist.name,
-        'artist_image_link': artist.image_link,
-        'start_time': show.start_time.strftime("%m/%d/%Y, %H:%M")
-      })
-
-  return render_template('pages/shows.html', shows=data)
+      add_cache_tags('venue:%d' % show.venue_id, 'artist:%d' % show.artist_id)
+  previous = (month - timedelta(days=1)).replace(day=1)
+  following = (month + timedelta(days=31)).replace(day=1)
+  return render_template('pages/calendar.html', weeks=weeks, month=month,
+    previous=previous, following=following, truncated=truncated,
+    filters=filters, genres=genres_choices)
 
 @app.route('/shows/create')
 def create_shows():
@@ -433,14 +536,29 @@ def create_show_submission():
       try:
           show=Show()
           form.populate_obj(show)
-          db.session.add(show)
-          db.session.commit()
-          # on successful db insert, flash success
-          flash('Show was successfully listed!')
+          show.end_time = show_end(show.start_time, show.end_time)
+          # a venue can't host two shows at once. find_conflict is a
+          # single index lookup, the exclusion constraint on postgres
+          # catches whatever slips past it.
+          conflict = find_conflict(show.venue_id, show.start_time, show.end_time)
+          if conflict is not None:
+              flash('The venue is already booked from %s to %s.' % (
+                conflict.start_time.strftime('%Y-%m-%d %H:%M'),
+                conflict.end_time.strftime('%Y-%m-%d %H:%M')))
+          else:
+              db.session.add(show)
+              db.session.commit()
+              # the show and the counters changed on the venue and
+              # artist pages
+              invalidate('shows', 'venue:%s' % form.venue_id.data,
+                'artist:%s' % form.artist_id.data)
+              # on successful db insert, flash success
+              flash('Show was successfully listed!')
 
       except Exception as e:
           print(e)
           db.session.rollback()
+          flash('An error occurred. Show could not be listed.')
 
       finally:
           db.session.close()
@@ -473,6 +591,9 @@ if not app.debug:
     app.logger.addHandler(file_handler)
     app.logger.info('errors')
 
+# compile every template now instead of on the first requests
+warm_templates(app)
+
 #----------------------------------------------------------------------------#
 # Launch.
 #----------------------------------------------------------------------------#
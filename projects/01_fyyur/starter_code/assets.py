@@ -0,0 +1,211 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+from flask import Blueprint, current_app, request, safe_join, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+#fingerprinted, precompressed static assets.
+#
+#`flask fyyur build-assets` concatenates the BUNDLES and copies every
+#other file under static/css and static/js into static/dist, each
+#named after a hash of its content (site.3f9a0c1d2b4e.css), next to a
+#.gz and, with the brotli package installed, a .br copy. Their names
+#go into static/dist/manifest.json.
+#
+#/assets/<name> serves them with a year long immutable Cache-Control,
+#the precompressed copy the browser accepts is sent as is. A changed
+#file gets a new name, so nothing is ever revalidated. Old files are
+#left in place for pages rendered before a deploy, --clean drops them.
+#
+#Templates link assets with asset_url('js/script.js') and loop over
+#asset_urls('site.css') for bundles. Without a build (or with
+#ASSETS_USE_DIST off) both fall back to the plain files in static/.
+
+BUNDLES = {
+    'site.css': [
+        'css/bootstrap.min.css',
+        'css/layout.main.css',
+        'css/main.css',
+        'css/main.responsive.css',
+        'css/main.quickfix.css',
+    ],
+    #loaded in <head>
+    'head.js': [
+        'js/libs/modernizr-2.8.2.min.js',
+        'js/libs/moment.min.js',
+    ],
+    #deferred, after jquery
+    'site.js': [
+        'js/script.js',
+        'js/libs/bootstrap-3.1.1.min.js',
+        'js/plugins.js',
+    ],
+}
+SOURCES = ('css', 'js')
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+#compressing these gains nothing
+COMPRESSED = {'.png', '.jpg', '.jpeg', '.gif', '.woff', '.woff2', '.gz', '.br'}
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+MAX_AGE = 365 * 24 * 3600
+
+assets = Blueprint('assets', __name__, url_prefix='/assets')
+
+
+def dist_dir(app):
+    return os.path.join(app.static_folder, DIST)
+
+
+def _read(app, name):
+    with open(os.path.join(app.static_folder, name), 'rb') as f:
+        return f.read()
+
+
+def _absolute_urls(app, name, css):
+    #relative url()s point elsewhere once the file moves to dist/
+    base = posixpath.dirname(name)
+
+    def absolute(match):
+        quote, url = match.groups()
+        if re.match(r'(/|data:|[a-z]+://|#)', url):
+            return match.group(0)
+        return 'url({0}{1}{0})'.format(quote, posixpath.normpath(
+            posixpath.join(app.static_url_path, base, url)))
+    return CSS_URL.sub(absolute, css.decode('utf-8')).encode('utf-8')
+
+
+def _content(app, name):
+    data = _read(app, name)
+    if name.endswith('.css'):
+        data = _absolute_urls(app, name, data)
+    return data
+
+
+def _bundle(app, names):
+    parts = [_content(app, name) for name in names]
+    if names[0].endswith('.js'):
+        #a file without a trailing semicolon must not run into the next
+        return b'\n;\n'.join(parts)
+    return b'\n'.join(parts)
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if not os.path.exists(path):
+        with open(path + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.tmp', path)
+
+
+def _fingerprint(directory, name, data):
+    stem, extension = posixpath.splitext(name)
+    built = '{}.{}{}'.format(stem, hashlib.sha256(data).hexdigest()[:12], extension)
+    path = os.path.join(directory, *built.split('/'))
+    written = [built]
+    _write(path, data)
+    if extension not in COMPRESSED:
+        #mtime=0 keeps the output the same from build to build
+        for suffix, compressed in (
+                ('.gz', gzip.compress(data, 9, mtime=0)),
+                ('.br', brotli.compress(data) if brotli else None)):
+            if compressed is not None and len(compressed) < len(data):
+                _write(path + suffix, compressed)
+                written.append(built + suffix)
+    return built, written
+
+
+def _sources(app):
+    for source in SOURCES:
+        top = os.path.join(app.static_folder, source)
+        for root, _, files in os.walk(top):
+            for filename in files:
+                path = os.path.join(root, filename)
+                yield os.path.relpath(path, app.static_folder).replace(os.sep, '/')
+
+
+def build(app, clean=False, echo=None):
+    echo = echo or (lambda message: None)
+    directory = dist_dir(app)
+    manifest, keep = {}, {MANIFEST}
+    for name, names in sorted(BUNDLES.items()):
+        manifest[name], written = _fingerprint(directory, name, _bundle(app, names))
+        keep.update(written)
+    for name in sorted(_sources(app)):
+        manifest[name], written = _fingerprint(directory, name, _content(app, name))
+        keep.update(written)
+    for name, built in sorted(manifest.items()):
+        echo('{} -> {}'.format(name, built))
+    with open(os.path.join(directory, MANIFEST + '.tmp'), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(os.path.join(directory, MANIFEST + '.tmp'),
+               os.path.join(directory, MANIFEST))
+    removed = 0
+    if clean:
+        for root, _, files in os.walk(directory):
+            for filename in files:
+                path = os.path.join(root, filename)
+                if os.path.relpath(path, directory).replace(os.sep, '/') not in keep:
+                    os.remove(path)
+                    removed += 1
+    app.extensions['asset_manifest'] = manifest
+    return manifest, removed
+
+
+def load_manifest(app):
+    try:
+        with open(os.path.join(dist_dir(app), MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _manifest():
+    if not current_app.config['ASSETS_USE_DIST']:
+        return {}
+    return current_app.extensions['asset_manifest']
+
+
+def asset_url(name):
+    built = _manifest().get(name)
+    if built is None:
+        return url_for('static', filename=name)
+    return url_for('assets.asset', filename=built)
+
+
+def asset_urls(name):
+    #a bundle is one file once built, its parts before
+    if name in BUNDLES and name not in _manifest():
+        return [url_for('static', filename=part) for part in BUNDLES[name]]
+    return [asset_url(name)]
+
+
+@assets.route('/<path:filename>')
+def asset(filename):
+    directory = dist_dir(current_app)
+    mimetype = mimetypes.guess_type(filename)[0]
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        path = safe_join(directory, filename + suffix)
+        if request.accept_encodings[encoding] and os.path.isfile(path):
+            response = send_from_directory(directory, filename + suffix,
+                                           mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(directory, filename)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'public, max-age={}, immutable'.format(MAX_AGE)
+    return response
+
+
+def init_assets(app):
+    app.extensions['asset_manifest'] = load_manifest(app)
+    app.register_blueprint(assets)
+    app.jinja_env.globals.update(asset_url=asset_url, asset_urls=asset_urls)
@@ -0,0 +1,329 @@
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+import click
+
+#benchmarks for the routes in app.py.
+#
+#    python bench.py --size 100k
+#    python bench.py --size 1k --compare bench_results/1k-<commit>.json
+#
+#Seeds a throwaway database with a synthetic dataset (synthetic.py) of
+#the given size (number of shows, with a venue per 20 and an artist
+#per 10 shows), then sends every route --requests requests through
+#the flask test client and records the p50/p99 latency and the number
+#of sql statements per request. Results go to bench_results/<size>-<commit>.json, --compare
+#prints the change against an earlier run.
+#
+#The database is --database-url, never DATABASE_URL, so this can't be
+#pointed at the real database by accident. It is dropped and seeded
+#again on every run unless --reuse is given. The page cache is off
+#unless --cache is given, so the numbers are those of a cache miss.
+
+SIZES = {'1k': 1000, '100k': 100000, '1m': 1000000}
+SHOW_SPACING = timedelta(hours=3)
+
+
+def load_app(database_url, cache):
+    os.environ['DATABASE_URL'] = database_url
+    os.environ.pop('FYYUR_REPLICA_URLS', None)
+    from app import app
+    app.debug = False
+    app.config.update(
+        WTF_CSRF_ENABLED=False,
+        PAGE_CACHE_ENABLED=cache,
+        #production settings, recording and lazy load checks cost time
+        SQLALCHEMY_RECORD_QUERIES=False,
+        RAISE_ON_LAZY_LOAD=False)
+    return app
+
+
+#  Dataset
+#  ----------------------------------------------------------------
+
+def reset_schema():
+    from models import db
+    if db.engine.dialect.name == 'postgresql':
+        #the constraints, triggers and extensions are in the migrations
+        from flask_migrate import upgrade
+        db.drop_all()
+        db.session.execute('DROP TABLE IF EXISTS alembic_version')
+        db.session.commit()
+        upgrade()
+    else:
+        db.drop_all()
+        db.create_all()
+
+
+def dataset_counts(shows):
+    return {'shows': shows, 'venues': max(shows // 20, 10),
+            'artists': max(shows // 10, 10)}
+
+
+def seed(counts, seed_, echo):
+    from synthetic import generate
+    started = time.monotonic()
+    generate(seed=seed_, **counts)
+    echo('seeded {venues} venues, {artists} artists, {shows} shows in {:.1f}s'
+         .format(time.monotonic() - started, **counts))
+
+
+#  Routes
+#  ----------------------------------------------------------------
+
+def _venue_form(name):
+    return {'name': name, 'city': 'San Francisco', 'state': 'CA',
+            'address': '1015 Folsom Street', 'phone': '123-123-1234',
+            'genres': ['Jazz', 'Folk'],
+            'facebook_link': 'https://www.facebook.com/bench'}
+
+
+def _artist_form(name):
+    return {'name': name, 'city': 'San Francisco', 'state': 'CA',
+            'phone': '326-123-5000', 'genres': ['Rock n Roll'],
+            'facebook_link': 'https://www.facebook.com/bench'}
+
+
+class Cases:
+    #one method per route of app.py. Each returns (method, url, form
+    #data) for the next request, anything it has to set up (the venue
+    #a delete request removes) happens here, outside the timing.
+    def __init__(self, counts, rng):
+        self.counts = counts
+        self.rng = rng
+        self.n = 0
+        self.next_show = datetime(2100, 1, 1)
+
+    def _venue(self):
+        return self.rng.randint(1, self.counts['venues'])
+
+    def _artist(self):
+        return self.rng.randint(1, self.counts['artists'])
+
+    def _term(self):
+        return self.rng.choice(['venue', 'artist', 'city 1', 'jazz', '12'])
+
+    def index(self):
+        return 'GET', '/', None
+
+    def venues(self):
+        return 'GET', '/venues', None
+
+    def search_venues(self):
+        return 'POST', '/venues/search', {'search_term': self._term()}
+
+    def show_venue(self):
+        return 'GET', '/venues/{}'.format(self._venue()), None
+
+    def create_venue_form(self):
+        return 'GET', '/venues/create', None
+
+    def create_venue_submission(self):
+        self.n += 1
+        return 'POST', '/venues/create', _venue_form('Bench Venue {}'.format(self.n))
+
+    def delete_venue(self):
+        from models import db, Venue
+        venue = Venue(**_venue_form('Bench Venue to delete'))
+        db.session.add(venue)
+        db.session.commit()
+        return 'POST', '/venues/{}'.format(venue.id), None
+
+    def artists(self):
+        return 'GET', '/artists', None
+
+    def search_artists(self):
+        return 'POST', '/artists/search', {'search_term': self._term()}
+
+    def show_artist(self):
+        return 'GET', '/artists/{}'.format(self._artist()), None
+
+    def edit_artist(self):
+        return 'GET', '/artists/{}/edit'.format(self._artist()), None
+
+    def edit_artist_submission(self):
+        artist_id = self._artist()
+        return 'POST', '/artists/{}/edit'.format(artist_id), _artist_form(
+            'Artist {}'.format(artist_id))
+
+    def edit_venue(self):
+        return 'GET', '/venues/{}/edit'.format(self._venue()), None
+
+    def edit_venue_submission(self):
+        venue_id = self._venue()
+        return 'POST', '/venues/{}/edit'.format(venue_id), _venue_form(
+            'Venue {}'.format(venue_id))
+
+    def create_artist_form(self):
+        return 'GET', '/artists/create', None
+
+    def create_artist_submission(self):
+        self.n += 1
+        return 'POST', '/artists/create', _artist_form('Bench Artist {}'.format(self.n))
+
+    def shows(self):
+        return 'GET', '/shows', None
+
+    def calendar(self):
+        return 'GET', '/calendar', None
+
+    def create_shows(self):
+        return 'GET', '/shows/create', None
+
+    def create_show_submission(self):
+        #far in the future and SHOW_SPACING apart, never a double booking
+        self.next_show += SHOW_SPACING
+        return 'POST', '/shows/create', {
+            'venue_id': str(self._venue()), 'artist_id': str(self._artist()),
+            'start_time': self.next_show.strftime('%Y-%m-%d %H:%M:%S')}
+
+
+def app_routes(app):
+    #the endpoints registered by app.py itself (no blueprints, static)
+    return sorted({rule.endpoint for rule in app.url_map.iter_rules()
+                   if '.' not in rule.endpoint and rule.endpoint != 'static'})
+
+
+#  Measuring
+#  ----------------------------------------------------------------
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+class StatementCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+def measure(app, cases, endpoint, requests, warmup):
+    from models import db
+    client = app.test_client()
+    statements = StatementCounter()
+    timings, counts, statuses = [], [], {}
+    with app.app_context():
+        engine = db.engine
+    from sqlalchemy import event
+    event.listen(engine, 'before_cursor_execute', statements)
+    try:
+        for i in range(warmup + requests):
+            with app.app_context():
+                method, url, data = getattr(cases, endpoint)()
+            statements.count = 0
+            started = time.perf_counter()
+            response = client.open(url, method=method, data=data)
+            elapsed = time.perf_counter() - started
+            if i < warmup:
+                continue
+            timings.append(elapsed * 1000)
+            counts.append(statements.count)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+    finally:
+        event.remove(engine, 'before_cursor_execute', statements)
+    return {
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'statements': max(counts),
+        'statements_mean': round(statistics.mean(counts), 2),
+        'status': {str(code): n for code, n in sorted(statuses.items())},
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(results, previous, echo):
+    echo('\n{:<28} {:>12} {:>12} {:>10}'.format(
+        'route', 'p50 change', 'p99 change', 'stmts'))
+    for endpoint, now in results['routes'].items():
+        before = previous['routes'].get(endpoint)
+        if before is None:
+            continue
+
+        def change(key):
+            if not before[key]:
+                return 'n/a'
+            return '{:+.0%}'.format(now[key] / before[key] - 1)
+
+        echo('{:<28} {:>12} {:>12} {:>10}'.format(
+            endpoint, change('p50_ms'), change('p99_ms'),
+            '{} -> {}'.format(before['statements'], now['statements'])))
+
+
+@click.command()
+@click.option('--size', type=click.Choice(sorted(SIZES)), default='1k', show_default=True)
+@click.option('--requests', default=100, show_default=True, help='timed requests per route')
+@click.option('--warmup', default=5, show_default=True)
+@click.option('--database-url', default='sqlite:///bench.db', show_default=True)
+@click.option('--reuse', is_flag=True, help='keep the data of the previous run')
+@click.option('--cache', is_flag=True, help='leave the page cache on')
+@click.option('--route', 'routes', multiple=True, help='only these endpoints')
+@click.option('--seed', 'seed_', default=0, show_default=True)
+@click.option('--output', default='bench_results', show_default=True)
+@click.option('--compare', 'compare_to', type=click.Path(exists=True, dir_okay=False),
+              help='an earlier result file')
+def main(size, requests, warmup, database_url, reuse, cache, routes, seed_,
+         output, compare_to):
+    """Benchmark every route of app.py on a synthetic dataset."""
+    app = load_app(database_url, cache)
+    counts = dataset_counts(SIZES[size])
+    if not reuse:
+        with app.app_context():
+            reset_schema()
+            seed(counts, seed_, click.echo)
+
+    cases = Cases(counts, random.Random(seed_))
+    results = {
+        'commit': git_commit(),
+        'date': datetime.utcnow().isoformat(timespec='seconds'),
+        'size': size,
+        'dataset': counts,
+        'database': database_url.split(':', 1)[0],
+        'python': platform.python_version(),
+        'requests': requests,
+        'routes': {},
+    }
+    failed = []
+    click.echo('{:<28} {:>9} {:>9} {:>6}  status'.format('route', 'p50 ms', 'p99 ms', 'stmts'))
+    for endpoint in routes or app_routes(app):
+        result = measure(app, cases, endpoint, requests, warmup)
+        results['routes'][endpoint] = result
+        click.echo('{:<28} {:>9.2f} {:>9.2f} {:>6}  {}'.format(
+            endpoint, result['p50_ms'], result['p99_ms'], result['statements'],
+            result['status']))
+        if any(code.startswith('5') for code in result['status']):
+            failed.append(endpoint)
+
+    os.makedirs(output, exist_ok=True)
+    path = os.path.join(output, '{}-{}.json'.format(size, results['commit']))
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    click.echo('results written to {}'.format(path))
+
+    if compare_to:
+        with open(compare_to) as f:
+            compare(results, json.load(f), click.echo)
+    if failed:
+        click.echo('server errors: {}'.format(', '.join(failed)), err=True)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
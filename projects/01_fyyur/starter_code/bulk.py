@@ -0,0 +1,259 @@
+import csv
+import io
+import json
+import time
+from collections import Counter
+from datetime import datetime
+from itertools import islice
+from sqlalchemy import bindparam, func, select, text
+from werkzeug.datastructures import MultiDict
+from forms import VenueForm, ArtistForm, ShowForm
+from models import db, Show, Venue, Artist
+from schedule import VenueSchedule, show_end
+from dedupe import name_key
+
+#streaming bulk import of venues, artists and shows.
+#
+#Files are read one row at a time (csv or jsonl), every row is
+#checked with the same form the web UI uses, and valid rows are
+#written in batches: COPY on postgres, executemany elsewhere. Only one
+#batch is held in memory, plus the map from the ids used in the file
+#to the ids the rows got in the database, which shows use to find
+#their venue and artist. Shows that would double book a venue (with
+#an existing show or one earlier in the file) are rejected, checked
+#against a VenueSchedule of the venues the file touches. Once a batch
+#is committed the schedule is trimmed to the shows of the venues used
+#most recently (SCHEDULE_SHOWS), the others are read back from the
+#database when they come up again, and on postgres the exclusion
+#constraint has the final word anyway.
+
+FORMS = {'venues': VenueForm, 'artists': ArtistForm, 'shows': ShowForm}
+MODELS = {'venues': Venue, 'artists': Artist, 'shows': Show}
+
+#shows (of the venues used most recently) the double booking check
+#keeps in memory between batches
+SCHEDULE_SHOWS = 200000
+
+#multi valued cells (genres) in csv files
+CSV_LIST_SEPARATOR = ';'
+LIST_FIELDS = ('genres',)
+#a BooleanField only reads 'false' and '' as false, csv files spell it
+#in other ways too (exports made before booleans were written as
+#true / false have 'False')
+FALSE_VALUES = {'false', 'f', 'no', 'n', 'off', '0'}
+
+
+def read_rows(path):
+    #yields (line number, row dict)
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith('.csv'):
+            for number, row in enumerate(csv.DictReader(f), start=2):
+                for field in LIST_FIELDS:
+                    if row.get(field):
+                        row[field] = row[field].split(CSV_LIST_SEPARATOR)
+                yield number, row
+        else:
+            for number, line in enumerate(f, start=1):
+                if line.strip():
+                    yield number, json.loads(line)
+
+
+def to_formdata(row):
+    data = MultiDict()
+    for key, value in row.items():
+        if value is None:
+            continue
+        if isinstance(value, list):
+            for item in value:
+                data.add(key, str(item))
+        elif isinstance(value, bool):
+            data.add(key, 'y' if value else 'false')
+        elif isinstance(value, str) and value.strip().lower() in FALSE_VALUES:
+            data.add(key, 'false')
+        else:
+            data.add(key, str(value))
+    return data
+
+
+class Report:
+    def __init__(self, kind):
+        self.kind = kind
+        self.read = self.inserted = 0
+        self.rejected = []
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def __str__(self):
+        rate = self.inserted / self.elapsed if self.elapsed else 0
+        return '{}: {} read, {} inserted, {} rejected in {:.1f}s ({:.0f} rows/s)'.format(
+            self.kind, self.read, self.inserted, len(self.rejected),
+            self.elapsed, rate)
+
+
+class Importer:
+    def __init__(self, batch_size=5000, echo=None):
+        self.batch_size = batch_size
+        self.echo = echo or (lambda message: None)
+        #ids used in the import files -> database ids
+        self.id_maps = {'venues': {}, 'artists': {}}
+        self.schedule = VenueSchedule(SCHEDULE_SHOWS)
+        self.postgres = db.engine.dialect.name == 'postgresql'
+
+    def import_file(self, kind, path):
+        report = Report(kind)
+        rows = self._validated(kind, read_rows(path), report)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            if kind == 'shows':
+                self._insert_shows(batch)
+            else:
+                self._insert_entities(kind, batch)
+            db.session.commit()
+            if kind == 'shows':
+                self.schedule.trim()
+            report.inserted += len(batch)
+            self.echo('{}: {} rows'.format(kind, report.inserted))
+        return report
+
+    def _validated(self, kind, rows, report):
+        form_class = FORMS[kind]
+        for number, row in rows:
+            report.read += 1
+            form = form_class(formdata=to_formdata(row), meta={'csrf': False})
+            if not form.validate():
+                report.rejected.append((number, form.errors))
+                continue
+            values = form.data
+            values.pop('csrf_token', None)
+            if kind == 'shows':
+                values = self._resolve_show(values)
+                if values is None:
+                    report.rejected.append((number, {'venue_id/artist_id': ['unknown id']}))
+                    continue
+                if not self._book(values):
+                    report.rejected.append((number, {'start_time': ['venue already booked']}))
+                    continue
+            else:
+                values['source_id'] = row.get('id')
+            yield values
+
+    def _resolve(self, kind, value):
+        #ids that were imported in this run are looked up in the id
+        #map, anything else has to be the id of an existing row
+        value = str(value or '').strip()
+        if value in self.id_maps[kind]:
+            return self.id_maps[kind][value]
+        return int(value) if value.isdigit() else None
+
+    def _resolve_show(self, values):
+        venue_id = self._resolve('venues', values['venue_id'])
+        artist_id = self._resolve('artists', values['artist_id'])
+        if venue_id is None or artist_id is None:
+            return None
+        values.update(venue_id=venue_id, artist_id=artist_id)
+        return values
+
+    def _book(self, values):
+        values['end_time'] = show_end(values['start_time'], values['end_time'])
+        if self.schedule.conflicts(values['venue_id'], values['start_time'],
+                                   values['end_time']):
+            return False
+        self.schedule.add(values['venue_id'], values['start_time'],
+                          values['end_time'])
+        return True
+
+    def _allocate_ids(self, table, count):
+        #reserve ids up front so the id map can be filled in without
+        #reading the rows back
+        if self.postgres:
+            return list(db.session.execute(text(
+                "SELECT nextval(pg_get_serial_sequence(:table, 'id')) "
+                "FROM generate_series(1, :count)"
+            ), {'table': table.name, 'count': count}).scalars())
+        start = db.session.execute(
+            select(func.coalesce(func.max(table.c.id), 0))).scalar() + 1
+        return list(range(start, start + count))
+
+    def _insert_entities(self, kind, batch):
+        table = MODELS[kind].__table__
+        ids = self._allocate_ids(table, len(batch))
+        for row_id, values in zip(ids, batch):
+            source_id = values.pop('source_id')
+            if source_id is not None:
+                self.id_maps[kind][str(source_id)] = row_id
+            values['id'] = row_id
+            #the mapper event in dedupe.py doesn't see these rows
+            values['name_key'] = name_key(values['name'])
+        self._write(table, batch)
+
+    def _insert_shows(self, batch):
+        now = datetime.now()
+        for values in batch:
+            start_time = values['start_time']
+            values['is_upcoming'] = start_time is not None and start_time > now
+        self._write(Show.__table__, batch)
+        count_shows(batch)
+
+    def _write(self, table, rows):
+        columns = [column.name for column in table.columns if column.name in rows[0]]
+        if self.postgres:
+            copy_rows(table, columns, rows)
+        else:
+            db.session.execute(table.insert(), rows)
+
+
+def _copy_field(value):
+    #None is an unquoted empty field, the only thing COPY reads as
+    #NULL. Everything else is quoted: a quoted empty string stays an
+    #empty string, and numbers, booleans and times parse quoted as well.
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        value = '{' + ','.join(
+            '"' + item.replace('\\', '\\\\').replace('"', '\\"') + '"'
+            for item in value) + '}'
+    elif isinstance(value, bool):
+        value = 'true' if value else 'false'
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def copy_data(columns, rows):
+    #the csv COPY reads for rows, one line per row
+    return ''.join(','.join(_copy_field(row[column]) for column in columns) + '\n'
+                   for row in rows)
+
+
+def copy_rows(table, columns, rows):
+    #COPY ... FROM STDIN in csv format through the session's own
+    #connection, so it is part of the same transaction
+    cursor = db.session.connection().connection.cursor()
+    cursor.copy_expert('COPY {} ({}) FROM STDIN WITH (FORMAT csv)'.format(
+        table.name, ', '.join(columns)), io.StringIO(copy_data(columns, rows)))
+
+
+def count_shows(rows):
+    #the counters in counters.py are kept by mapper events, which bulk
+    #writes bypass. Apply the same increments, one executemany per
+    #counter column for the whole batch.
+    deltas = Counter()
+    for row in rows:
+        if row['start_time'] is None:
+            continue
+        column = 'upcoming_shows_count' if row['is_upcoming'] else 'past_shows_count'
+        deltas[(Venue, row['venue_id'], column)] += 1
+        deltas[(Artist, row['artist_id'], column)] += 1
+    grouped = {}
+    for (model, row_id, column), n in deltas.items():
+        grouped.setdefault((model, column), []).append({'row_id': row_id, 'n': n})
+    for (model, column), params in grouped.items():
+        table = model.__table__
+        db.session.execute(
+            table.update()
+            .where(table.c.id == bindparam('row_id'))
+            .values({column: table.c[column] + bindparam('n')}),
+            params)
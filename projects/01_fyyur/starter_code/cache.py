@@ -0,0 +1,173 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, g, make_response, request, session
+from routing import sticky
+
+#bounded in-memory LRU cache with tag based invalidation, and the
+#rendered page cache built on top of it.
+#
+#Entries are tagged with the entities they were built from
+#('venue:3', 'artist:7') and with the listing they belong to
+#('venues', 'artists', 'shows'). The create/edit/delete handlers
+#invalidate exactly those tags, everything else stays cached.
+#
+#The cache lives in the worker process. Other workers (and the cron
+#jobs) can't reach it, so every entry also has a ttl that bounds how
+#stale a page can get after a write made somewhere else.
+#
+#value_cache holds smaller computed results (the genre facet counts)
+#under the same tags, so one invalidate() drops both.
+#
+#fragment_cache holds rendered template fragments ({% cache %}, see
+#fragments.py). Their keys carry updated_at, so they need neither tags
+#nor a ttl.
+
+
+class LRUCache:
+    def __init__(self, max_bytes=0, ttl=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        #key -> (expires, value, size, tags), least recently used first
+        self.entries = OrderedDict()
+        #tag -> set of keys
+        self.tags = {}
+        self.size = 0
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] is not None and entry[0] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, size=1, tags=()):
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            expires = time.monotonic() + self.ttl if self.ttl else None
+            self.entries[key] = (expires, value, size, frozenset(tags))
+            self.size += size
+            for tag in tags:
+                self.tags.setdefault(tag, set()).add(key)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def invalidate(self, *tags):
+        with self.lock:
+            for tag in tags:
+                for key in list(self.tags.get(tag, ())):
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.tags.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        _, _, size, tags = self.entries.pop(key)
+        self.size -= size
+        for tag in tags:
+            keys = self.tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tags[tag]
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else None,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+page_cache = LRUCache()
+#every entry has size 1 here, max_bytes is the number of entries
+value_cache = LRUCache()
+fragment_cache = LRUCache()
+
+
+def init_page_cache(app):
+    page_cache.max_bytes = app.config['PAGE_CACHE_MAX_BYTES']
+    page_cache.ttl = app.config['PAGE_CACHE_TTL']
+    value_cache.max_bytes = app.config['VALUE_CACHE_MAX_ENTRIES']
+    value_cache.ttl = app.config['PAGE_CACHE_TTL']
+    fragment_cache.max_bytes = app.config['FRAGMENT_CACHE_MAX_BYTES']
+
+
+def add_cache_tags(*tags):
+    #called by a view while it renders, to tag the cached page with
+    #the entities that ended up on it
+    if 'cache_tags' in g:
+        g.cache_tags.update(tags)
+
+
+def invalidate(*tags):
+    page_cache.invalidate(*tags)
+    value_cache.invalidate(*tags)
+
+
+def cached_value(key, compute, tags=()):
+    value = value_cache.get(key)
+    if value is None:
+        value = compute()
+        value_cache.set(key, value, tags=tags)
+    return value
+
+
+def cached_page(*tags):
+    #caches the rendered body of a GET route keyed by its full path.
+    #tags can use the view arguments: @cached_page('venue:{venue_id}')
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            #pages are rendered with the flashed messages in them,
+            #those must neither be cached nor hidden by a cached page.
+            #A client that just wrote reads its own writes from the
+            #primary (see routing.py), not from the cache.
+            if (not current_app.config['PAGE_CACHE_ENABLED']
+                    or request.method != 'GET' or '_flashes' in session
+                    or sticky()):
+                return view(*args, **kwargs)
+
+            key = request.full_path
+            cached = page_cache.get(key)
+            if cached is not None:
+                body, mimetype = cached
+                response = current_app.response_class(body, mimetype=mimetype)
+                response.headers['X-Cache'] = 'HIT'
+                return response
+
+            g.cache_tags = set(tag.format(**kwargs) for tag in tags)
+            response = make_response(view(*args, **kwargs))
+            if (response.status_code == 200 and not response.direct_passthrough
+                    and '_flashes' not in session):
+                body = response.get_data()
+                page_cache.set(key, (body, response.mimetype),
+                               size=len(body), tags=g.cache_tags)
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,142 @@
+import click
+from flask import current_app
+from flask.cli import AppGroup
+import counters
+from bulk import Importer
+import export as catalogue_export
+import synthetic
+import assets
+import templating
+import dedupe as duplicates
+from models import Venue, Artist
+
+#maintenance commands, available as `flask fyyur <command>`
+fyyur_cli = AppGroup('fyyur', help='Fyyur maintenance commands.')
+
+
+@fyyur_cli.command('rollover-shows')
+def rollover_shows():
+    """Move shows that have started from upcoming to past counters.
+
+    Meant to be run from cron, e.g. every 5 minutes.
+    """
+    moved = counters.roll_over()
+    click.echo('{} shows rolled over to past'.format(moved))
+
+
+@fyyur_cli.command('rebuild-counters')
+def rebuild_counters():
+    """Recompute every venue and artist show counter."""
+    counters.rebuild()
+    click.echo('show counters rebuilt')
+
+
+@fyyur_cli.command('import')
+@click.option('--venues', type=click.Path(exists=True, dir_okay=False),
+              help='csv or jsonl file of venues')
+@click.option('--artists', type=click.Path(exists=True, dir_okay=False),
+              help='csv or jsonl file of artists')
+@click.option('--shows', type=click.Path(exists=True, dir_okay=False),
+              help='csv or jsonl file of shows')
+@click.option('--batch-size', default=5000, show_default=True)
+def import_catalogue(venues, artists, shows, batch_size):
+    """Stream venues, artists and shows into the database.
+
+    Rows are validated with the same forms as the web UI. Venues and
+    artists may carry an `id` column, shows refer to those ids (or to
+    ids already in the database) in venue_id / artist_id. Genres in csv
+    files are separated by `;`.
+    """
+    importer = Importer(batch_size=batch_size, echo=click.echo)
+    for kind, path in (('venues', venues), ('artists', artists), ('shows', shows)):
+        if path is None:
+            continue
+        report = importer.import_file(kind, path)
+        for number, errors in report.rejected:
+            click.echo('{} line {}: {}'.format(path, number, errors), err=True)
+        click.echo(str(report))
+
+
+@fyyur_cli.command('export')
+@click.argument('kind', type=click.Choice(sorted(catalogue_export.COLUMNS)))
+@click.option('--format', 'format_', type=click.Choice(catalogue_export.FORMATS),
+              default='jsonl', show_default=True)
+@click.option('--since', type=click.DateTime(
+              formats=['%Y-%m-%d', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S']),
+              help='only rows changed at or after this time (utc)')
+@click.option('--output', type=click.File('w'), default='-',
+              help='file to write to, stdout by default')
+def export_catalogue(kind, format_, since, output):
+    """Stream venues, artists or shows out as jsonl or csv."""
+    for chunk in catalogue_export.export(kind, format_, since):
+        output.write(chunk)
+
+
+@fyyur_cli.command('generate')
+@click.option('--venues', default=0, show_default=True)
+@click.option('--artists', default=0, show_default=True)
+@click.option('--shows', default=0, show_default=True)
+@click.option('--seed', default=0, show_default=True)
+@click.option('--start', type=click.DateTime(formats=['%Y-%m-%d', '%Y-%m-%dT%H:%M:%S']),
+              default=synthetic.START.strftime('%Y-%m-%d'), show_default=True,
+              help='when the first show of a venue starts')
+@click.option('--batch-size', default=10000, show_default=True)
+def generate(venues, artists, shows, seed, start, batch_size):
+    """Add synthetic venues, artists and shows.
+
+    The same seed and start on the same database give the same rows.
+    Running it again adds more rows after the existing ones, shows are
+    spread over every venue and artist in the database.
+    """
+    try:
+        synthetic.generate(venues, artists, shows, seed=seed,
+                           batch_size=batch_size, echo=click.echo, start=start)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+
+
+@fyyur_cli.command('warm-templates')
+def warm_templates():
+    """Compile every template into the bytecode cache.
+
+    The app does this when it starts (TEMPLATE_WARMUP), run it before
+    the workers start (e.g. in the release phase of a deploy) and they
+    all find a full cache.
+    """
+    report = current_app.extensions.get('template_warmup') \
+        or templating.warm_templates(current_app)
+    if report is None:
+        raise click.UsageError('TEMPLATE_WARMUP is off')
+    click.echo('{} templates in {:.1f}ms, {} from the bytecode cache'.format(
+        report['templates'], report['ms'], report.get('hits', 0)))
+    for name in report['failed']:
+        click.echo('{} does not compile'.format(name), err=True)
+
+
+@fyyur_cli.command('build-assets')
+@click.option('--clean', is_flag=True, help='remove files of earlier builds')
+def build_assets(clean):
+    """Fingerprint and precompress static/css and static/js into static/dist."""
+    manifest, removed = assets.build(current_app, clean=clean, echo=click.echo)
+    if assets.brotli is None:
+        click.echo('brotli is not installed, only gzip copies were written')
+    click.echo('{} assets built, {} old files removed'.format(len(manifest), removed))
+
+
+@fyyur_cli.command('dedupe')
+@click.argument('kind', type=click.Choice(['venues', 'artists']))
+@click.option('--threshold', type=click.FloatRange(0, 1),
+              help='name similarity, DUPLICATE_SIMILARITY by default')
+@click.option('--merge', is_flag=True, help='merge them, otherwise only list them')
+def dedupe(kind, threshold, merge):
+    """Find and merge duplicate venues or artists.
+
+    Groups of similar names (venues in the same city) are listed. With
+    --merge each group is merged into the row with the most shows: the
+    shows of the others move to it and the others are deleted. A venue
+    whose shows overlap shows of the one it would be merged into is
+    left alone, unless it is the same show listed twice.
+    """
+    model = {'venues': Venue, 'artists': Artist}[kind]
+    groups, merged = duplicates.dedupe(model, threshold, apply=merge, echo=click.echo)
+    click.echo('{} groups of duplicates, {} {} merged'.format(groups, merged, kind))
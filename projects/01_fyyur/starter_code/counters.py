@@ -0,0 +1,93 @@
+from datetime import datetime
+from sqlalchemy import and_, event, func, select, update
+from models import db, Show, Venue, Artist
+
+#maintained upcoming/past show counters on venue and artist.
+#
+#Every show with a start_time is counted exactly once, in either the
+#upcoming or the past counter of its venue and of its artist.
+#Show.is_upcoming remembers which one, so a delete knows what to
+#decrement and roll_over() knows which shows still have to move from
+#upcoming to past. Pages read the counter columns directly instead of
+#loading and splitting every show.
+
+COUNTED = ((Venue, 'venue_id'), (Artist, 'artist_id'))
+
+
+def _adjust(connection, show, delta):
+    if show.start_time is None:
+        return
+    column = 'upcoming_shows_count' if show.is_upcoming else 'past_shows_count'
+    for model, key in COUNTED:
+        connection.execute(
+            update(model.__table__)
+            .where(model.__table__.c.id == getattr(show, key))
+            .values({column: model.__table__.c[column] + delta}))
+
+
+@event.listens_for(Show, 'before_insert')
+def _classify(mapper, connection, show):
+    show.is_upcoming = (show.start_time is not None
+                        and show.start_time > datetime.now())
+
+
+@event.listens_for(Show, 'after_insert')
+def _count_insert(mapper, connection, show):
+    #runs inside the flush, so the counters commit (or roll back)
+    #together with the show itself.
+    _adjust(connection, show, 1)
+
+
+@event.listens_for(Show, 'after_delete')
+def _count_delete(mapper, connection, show):
+    _adjust(connection, show, -1)
+
+
+def roll_over(now=None):
+    #moves every show that has started since the last run from the
+    #upcoming to the past counters. Only the shows that changed are
+    #touched (the partial index on show.start_time WHERE is_upcoming
+    #finds them), so this is cheap to run from cron every few minutes.
+    now = now or datetime.now()
+    shows = Show.__table__
+    due = and_(shows.c.is_upcoming, shows.c.start_time <= now)
+    for model, key in COUNTED:
+        table = model.__table__
+        #correlated count instead of UPDATE ... FROM so the same
+        #statement also runs on sqlite
+        n = select(func.count()).where(
+            due, shows.c[key] == table.c.id).scalar_subquery()
+        db.session.execute(
+            update(table)
+            .where(table.c.id.in_(select(shows.c[key]).where(due)))
+            .values(
+                upcoming_shows_count=table.c.upcoming_shows_count - n,
+                past_shows_count=table.c.past_shows_count + n))
+    moved = db.session.execute(
+        update(shows).where(due).values(is_upcoming=False)).rowcount
+    db.session.commit()
+    return moved
+
+
+def rebuild(now=None):
+    #recomputes every counter from the show table. Needed after bulk
+    #loads that insert shows without going through the ORM.
+    now = now or datetime.now()
+    shows = Show.__table__
+    db.session.execute(
+        update(shows).values(
+            is_upcoming=func.coalesce(shows.c.start_time > now, False)))
+    for model, key in COUNTED:
+        table = model.__table__
+
+        def count(upcoming):
+            return select(func.count()).where(
+                shows.c[key] == table.c.id,
+                shows.c.start_time.isnot(None),
+                shows.c.is_upcoming == upcoming
+            ).scalar_subquery()
+
+        db.session.execute(update(table).values(
+            upcoming_shows_count=count(True),
+            past_shows_count=count(False)))
+    db.session.commit()
@@ -0,0 +1,91 @@
+import os
+from flask import current_app, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool
+from models import db
+
+#engine configuration from the DB_* settings in config.py.
+#
+#The pool is bounded (DB_POOL_SIZE + DB_MAX_OVERFLOW per worker) and
+#a request waits at most DB_POOL_TIMEOUT seconds for a connection, so
+#a burst of traffic queues briefly or fails instead of opening a
+#connection per request. pre-ping and recycle replace connections
+#the server or a proxy has closed.
+#
+#statement_timeout keeps a stuck query from hanging a worker. Without
+#PgBouncer the default is a connect option and only endpoints with
+#their own timeout (DB_STATEMENT_TIMEOUTS) run a SET LOCAL when their
+#transaction begins. Behind PgBouncer in transaction mode connect
+#options are rejected and session settings leak between clients, so
+#every transaction sets its timeout with SET LOCAL.
+
+
+def configure_engine(app):
+    #before db.init_app, the engine is created from these on first use
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+
+
+def engine_options(config):
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() != 'postgresql':
+        #sqlite gets its pool from flask_sqlalchemy
+        return {}
+    options = {'pool_pre_ping': config['DB_POOL_PRE_PING']}
+    if config['DB_POOL_SIZE']:
+        options.update(
+            pool_size=config['DB_POOL_SIZE'],
+            max_overflow=config['DB_MAX_OVERFLOW'],
+            pool_timeout=config['DB_POOL_TIMEOUT'],
+            pool_recycle=config['DB_POOL_RECYCLE'])
+    else:
+        options['poolclass'] = NullPool
+    if config['DB_STATEMENT_TIMEOUT'] and not config['DB_PGBOUNCER']:
+        options['connect_args'] = {
+            'options': '-c statement_timeout=%d' % config['DB_STATEMENT_TIMEOUT']}
+    return options
+
+
+def _statement_timeout(config):
+    #the timeout this transaction needs, None if the connection
+    #default already is the right one
+    if has_request_context():
+        timeout = config['DB_STATEMENT_TIMEOUTS'].get(
+            request.endpoint, config['DB_STATEMENT_TIMEOUT'])
+    else:
+        timeout = 0
+    default = 0 if config['DB_PGBOUNCER'] else config['DB_STATEMENT_TIMEOUT']
+    return timeout if timeout != default else None
+
+
+@event.listens_for(db.session, 'after_begin')
+def _set_statement_timeout(session, transaction, connection):
+    if connection.dialect.name != 'postgresql' or not has_app_context():
+        return
+    timeout = _statement_timeout(current_app.config)
+    if timeout is not None:
+        #straight on the dbapi connection: engine events would count
+        #it as one of the request's statements (query_budget, X-SQL-Count)
+        cursor = connection.connection.cursor()
+        try:
+            cursor.execute('SET LOCAL statement_timeout = %d' % timeout)
+        finally:
+            cursor.close()
+
+
+def pool_stats():
+    #pools of this worker process only, every worker has its own
+    stats = _pool_stats(db.engine.pool)
+    stats['pid'] = os.getpid()
+    stats['replicas'] = {
+        bind: _pool_stats(db.get_engine(bind=bind).pool)
+        for bind in current_app.config['REPLICA_BINDS']}
+    return stats
+
+
+def _pool_stats(pool):
+    stats = {'pool': type(pool).__name__, 'status': pool.status()}
+    for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+        if hasattr(pool, name):
+            stats[name] = getattr(pool, name)()
+    return stats
@@ -0,0 +1,293 @@
+import re
+import unicodedata
+from flask import current_app
+from sqlalchemy import event, func, select, update
+from models import db, Show, Venue, Artist
+from schedule import VenueSchedule
+import search
+
+#fuzzy duplicate detection for venues and artists.
+#
+#name_key is the name reduced to what tells two names apart: no case,
+#accents or punctuation, '&' and 'n' spelled out, a leading or trailing
+#article dropped, so "The Musical Hop" and "Musical Hop, The" are both
+#"musical hop". Two names are duplicate candidates when the trigram
+#similarity of their keys (the pg_trgm definition) is at least
+#DUPLICATE_SIMILARITY and they have the same numbers in them ("Room 1"
+#is not "Room 2"); venues also have to be in the same city.
+#
+#On postgres candidates come from the pg_trgm GIN index on name_key
+#(the % operator, with the threshold raised for the transaction so the
+#index hands back only real candidates). Elsewhere the keys are
+#compared in python.
+#
+#find_duplicates() is the check before a new venue or artist is
+#listed, clusters() and merge() are `flask fyyur dedupe`: every group
+#of candidates is merged into the row with the most shows, the shows
+#of the others move over to it and the others are deleted.
+
+ARTICLES = {'the', 'a', 'an'}
+WORD = re.compile(r'[^\W_]+')
+NUMBER = re.compile(r'\d+')
+#venues are only duplicates of venues in the same place
+SCOPE = {Venue: ('city', 'state'), Artist: ()}
+#filled in from a duplicate when the row that is kept has nothing
+FILLED = ('address', 'phone', 'image_link', 'facebook_link', 'website_link',
+          'seeking_description')
+SHOW_KEY = {Venue: 'venue_id', Artist: 'artist_id'}
+
+
+def name_key(name):
+    text = unicodedata.normalize('NFKD', name or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    words = ['and' if word == 'n' else word
+             for word in WORD.findall(text.lower().replace('&', ' and '))]
+    if len(words) > 1 and words[0] in ARTICLES:
+        words = words[1:]
+    if len(words) > 1 and words[-1] in ARTICLES:
+        words = words[:-1]
+    return ' '.join(words)
+
+
+@event.listens_for(Venue, 'before_insert')
+@event.listens_for(Venue, 'before_update')
+@event.listens_for(Artist, 'before_insert')
+@event.listens_for(Artist, 'before_update')
+def _set_name_key(mapper, connection, target):
+    target.name_key = name_key(target.name)
+
+
+def trigrams(key):
+    #pg_trgm's: every word padded with two spaces in front, one behind
+    grams = set()
+    for word in key.split():
+        padded = '  ' + word + ' '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _numbers(key):
+    return NUMBER.findall(key)
+
+
+def _numbers_sql(column):
+    #' '.join(_numbers(key)) on postgres
+    return func.btrim(func.regexp_replace(column, r'\D+', ' ', 'g'))
+
+
+def similar(a, b, threshold):
+    return _numbers(a) == _numbers(b) and similarity(a, b) >= threshold
+
+
+def similarity(a, b):
+    a, b = trigrams(a), trigrams(b)
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _threshold(threshold):
+    if threshold is None:
+        threshold = current_app.config['DUPLICATE_SIMILARITY']
+    if db.engine.dialect.name == 'postgresql':
+        #for the rest of the transaction, % then only matches what
+        #the similarity() filter keeps
+        db.session.execute(select(func.set_config(
+            'pg_trgm.similarity_threshold', str(threshold), True)))
+    return threshold
+
+
+def find_duplicates(model, name, city=None, state=None, limit=5, threshold=None):
+    #the existing rows a new one called name is probably a duplicate
+    #of, best match first: [(id, name, similarity)]
+    key = name_key(name)
+    if not key:
+        return []
+    threshold = _threshold(threshold)
+    place = {'city': city, 'state': state}
+    query = db.session.query(model.id, model.name, model.name_key).filter(
+        *[getattr(model, column) == place[column] for column in SCOPE[model]])
+    if db.engine.dialect.name == 'postgresql':
+        #the numbers are compared in the query, before the limit, so
+        #names with other numbers can't crowd out the real candidates
+        score = func.similarity(model.name_key, key)
+        rows = query.add_columns(score).filter(
+            model.name_key.op('%')(key), score >= threshold,
+            _numbers_sql(model.name_key) == ' '.join(_numbers(key))
+        ).order_by(score.desc(), model.id).limit(limit)
+        return [(row.id, row.name, row[-1]) for row in rows]
+    matches = []
+    for row in query.filter(model.name_key.isnot(None)):
+        if similar(key, row.name_key, threshold):
+            matches.append((row.id, row.name, similarity(key, row.name_key)))
+    matches.sort(key=lambda match: (-match[2], match[0]))
+    return matches[:limit]
+
+
+#  Batch job
+#  ----------------------------------------------------------------
+
+def _pairs(model, threshold, batch_size):
+    #(id, id) of every pair of candidates, lower id first
+    table = model.__table__
+    if db.engine.dialect.name == 'postgresql':
+        a, b = table.alias('a'), table.alias('b')
+        last = db.session.query(func.max(table.c.id)).scalar() or 0
+        for start in range(0, last + 1, batch_size):
+            #a short statement per range of ids, the % join probes the
+            #trigram index once per row
+            _threshold(threshold)
+            for id_a, key_a, id_b, key_b in db.session.execute(
+                    select(a.c.id, a.c.name_key, b.c.id, b.c.name_key)
+                    .select_from(a.join(b, a.c.id < b.c.id))
+                    .where(a.c.id >= start, a.c.id < start + batch_size,
+                           a.c.name_key.op('%')(b.c.name_key),
+                           func.similarity(a.c.name_key, b.c.name_key) >= threshold,
+                           *[a.c[column] == b.c[column] for column in SCOPE[model]])):
+                if _numbers(key_a) == _numbers(key_b):
+                    yield id_a, id_b
+        return
+    #trigram postings, so each key is only compared with the keys that
+    #share a trigram with it
+    postings = {}
+    keys = {}
+    for row in db.session.execute(
+            select(table.c.id, table.c.name_key,
+                   *[table.c[column] for column in SCOPE[model]])
+            .where(table.c.name_key.isnot(None)).order_by(table.c.id)):
+        row_id, key, scope = row[0], row[1], tuple(row[2:])
+        grams = trigrams(key)
+        seen = set()
+        for gram in grams:
+            for other in postings.get((scope, gram), ()):
+                if other not in seen:
+                    seen.add(other)
+                    if similar(key, keys[other], threshold):
+                        yield other, row_id
+            postings.setdefault((scope, gram), []).append(row_id)
+        keys[row_id] = key
+
+
+def clusters(model, threshold=None, batch_size=10000):
+    #groups of duplicate candidates (connected by candidate pairs),
+    #each a sorted list of ids
+    if threshold is None:
+        threshold = current_app.config['DUPLICATE_SIMILARITY']
+    parent = {}
+
+    def find(row_id):
+        parent.setdefault(row_id, row_id)
+        while parent[row_id] != row_id:
+            parent[row_id] = parent[parent[row_id]]
+            row_id = parent[row_id]
+        return row_id
+
+    for a, b in _pairs(model, threshold, batch_size):
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+    groups = {}
+    for row_id in parent:
+        groups.setdefault(find(row_id), []).append(row_id)
+    return sorted(sorted(group) for group in groups.values())
+
+
+class MergeConflict(Exception):
+    pass
+
+
+def _move_venue_shows(keep, duplicate):
+    #a venue can't host two shows at once. A show of the duplicate that
+    #overlaps one of the kept venue is dropped if it is the same show
+    #(same artist, same start) listed twice, anything else can't be
+    #merged without a person deciding. Returns the dropped shows.
+    schedule = VenueSchedule()
+    shows = Show.__table__
+    kept = {(row.artist_id, row.start_time) for row in db.session.execute(
+        select(shows.c.artist_id, shows.c.start_time).where(shows.c.venue_id == keep.id))}
+    dropped = []
+    for show in db.session.execute(
+            select(shows).where(shows.c.venue_id == duplicate.id,
+                                shows.c.start_time.isnot(None),
+                                shows.c.end_time.isnot(None))
+            .order_by(shows.c.start_time)):
+        if not schedule.conflicts(keep.id, show.start_time, show.end_time):
+            schedule.add(keep.id, show.start_time, show.end_time)
+        elif (show.artist_id, show.start_time) in kept:
+            dropped.append(show)
+        else:
+            raise MergeConflict('show {} of venue {} overlaps a show of venue {}'.format(
+                show.id, duplicate.id, keep.id))
+    artists = Artist.__table__
+    for show in dropped:
+        column = 'upcoming_shows_count' if show.is_upcoming else 'past_shows_count'
+        db.session.execute(update(artists).where(artists.c.id == show.artist_id)
+                           .values({column: artists.c[column] - 1}))
+        db.session.execute(shows.delete().where(shows.c.id == show.id))
+    return dropped
+
+
+def merge(model, ids):
+    #merges the rows into the one with the most shows (the lowest id
+    #of those), returns (kept id, merged ids, dropped double shows).
+    #Commits, or rolls back and raises MergeConflict.
+    rows = model.query.filter(model.id.in_(ids)).order_by(model.id).all()
+    keep = max(rows, key=lambda row: (
+        row.upcoming_shows_count + row.past_shows_count, -row.id))
+    duplicates = [row for row in rows if row is not keep]
+    key = SHOW_KEY[model]
+    dropped = 0
+    try:
+        for duplicate in duplicates:
+            counts = {'upcoming_shows_count': duplicate.upcoming_shows_count,
+                      'past_shows_count': duplicate.past_shows_count}
+            if model is Venue:
+                for show in _move_venue_shows(keep, duplicate):
+                    counts['upcoming_shows_count' if show.is_upcoming
+                           else 'past_shows_count'] -= 1
+                    dropped += 1
+            db.session.execute(update(Show.__table__)
+                               .where(Show.__table__.c[key] == duplicate.id)
+                               .values({key: keep.id}))
+            keep.upcoming_shows_count += counts['upcoming_shows_count']
+            keep.past_shows_count += counts['past_shows_count']
+            keep.genres = sorted(set(keep.genres or []) | set(duplicate.genres or []))
+            for column in FILLED:
+                if hasattr(model, column) and not getattr(keep, column) \
+                        and getattr(duplicate, column):
+                    setattr(keep, column, getattr(duplicate, column))
+            #a bulk delete, the shows are gone already and the session
+            #must not go looking for them
+            model.query.filter(model.id == duplicate.id).delete(
+                synchronize_session='evaluate')
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return keep.id, [row.id for row in duplicates], dropped
+
+
+def dedupe(model, threshold=None, apply=False, echo=None):
+    #finds (and with apply, merges) every cluster of duplicates.
+    #Returns the number of clusters and of rows merged away.
+    echo = echo or (lambda message: None)
+    groups = clusters(model, threshold)
+    merged = 0
+    names = dict(db.session.query(model.id, model.name).filter(
+        model.id.in_([row_id for group in groups for row_id in group]))) if groups else {}
+    for group in groups:
+        echo(' | '.join('{} {}'.format(row_id, names.get(row_id)) for row_id in group))
+        if not apply:
+            continue
+        try:
+            keep, gone, dropped = merge(model, group)
+        except MergeConflict as e:
+            echo('  not merged: {}'.format(e))
+            continue
+        merged += len(gone)
+        echo('  merged into {}{}'.format(
+            keep, ', {} double shows dropped'.format(dropped) if dropped else ''))
+    if merged:
+        #the deletes went through the session, the moved shows did not
+        search.reset()
+    return len(groups), merged
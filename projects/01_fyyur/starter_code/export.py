@@ -0,0 +1,98 @@
+import csv
+import io
+import json
+from datetime import datetime
+from models import db, Show, Venue, Artist
+
+#streaming export of the catalogue as jsonl or csv.
+#
+#Rows come from a server side cursor (yield_per), so memory stays
+#flat however big the tables are. With `since`, only rows whose
+#updated_at is at or after it are exported (through the updated_at
+#index), which is what the nightly incremental exports use. Deleted
+#rows can't show up in an incremental export.
+
+COLUMNS = {
+    'venues': [Venue.id, Venue.name, Venue.city, Venue.state, Venue.address,
+               Venue.phone, Venue.genres, Venue.image_link, Venue.facebook_link,
+               Venue.website_link, Venue.seeking_talent,
+               Venue.seeking_description, Venue.updated_at],
+    'artists': [Artist.id, Artist.name, Artist.city, Artist.state, Artist.phone,
+                Artist.genres, Artist.image_link, Artist.facebook_link,
+                Artist.website_link, Artist.seeking_venue,
+                Artist.seeking_description, Artist.updated_at],
+    'shows': [Show.id, Show.venue_id, Show.artist_id, Show.start_time,
+              Show.end_time, Show.updated_at],
+}
+FORMATS = ('jsonl', 'csv')
+
+BATCH_SIZE = 1000
+
+
+def export_rows(kind, since=None):
+    columns = COLUMNS[kind]
+    updated_at = columns[-1]
+    query = db.session.query(*columns)
+    if since is not None:
+        query = query.filter(updated_at >= since).order_by(
+            updated_at, columns[0])
+    else:
+        query = query.order_by(columns[0])
+    return query.yield_per(BATCH_SIZE)
+
+
+def _value(value):
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    return value
+
+
+def as_jsonl(kind, rows):
+    names = [column.key for column in COLUMNS[kind]]
+    for row in rows:
+        yield json.dumps(dict(zip(names, map(_value, row)))) + '\n'
+
+
+def _csv_value(value):
+    if isinstance(value, list):
+        return ';'.join(value)
+    if isinstance(value, bool):
+        #str(False) is 'False', which a BooleanField reads as true
+        return 'true' if value else 'false'
+    return _value(value)
+
+
+def as_csv(kind, rows):
+    #same layout the importer reads: a header line, genres joined
+    #with ';' and booleans as true / false
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    writer.writerow([column.key for column in COLUMNS[kind]])
+    yield flush()
+    for row in rows:
+        writer.writerow([_csv_value(value) for value in row])
+        yield flush()
+
+
+def _chunked(lines):
+    #one write per BATCH_SIZE rows instead of one per row
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= BATCH_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def export(kind, format, since=None):
+    serialize = as_csv if format == 'csv' else as_jsonl
+    return _chunked(serialize(kind, export_rows(kind, since)))
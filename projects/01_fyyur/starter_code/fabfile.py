@@ -6,8 +6,10 @@ from fabric.contrib.console import confirm
 
 def test():
     with settings(warn_only=True):
+        # runs every route against a small seeded sqlite database and
+        # fails on any server error, see bench.py
         result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
+            "python bench.py --size 1k --requests 20", capture=True
         )
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
@@ -40,7 +42,7 @@ def heroku():
 
 def heroku_test():
     local(
-        "heroku run python test_tasks.py -v && heroku run python test_users.py -v"
+        "heroku run python bench.py --size 1k --requests 20"
     )
 
 
@@ -0,0 +1,42 @@
+from jinja2 import nodes
+from jinja2.ext import Extension
+from cache import fragment_cache
+
+#{% cache %} fragment caching for templates.
+#
+#    {% cache 'venue', venue.id, venue.updated_at %}
+#      ...the venue's tile...
+#    {% endcache %}
+#
+#The rendered block is kept in fragment_cache (cache.py) under the
+#template, the line of the tag and the given values, and reused the
+#next time the same values come by. Pass everything the block shows
+#that can change (as hashable values), in practice the ids and
+#updated_at of the rows it is rendered from: an edit bumps updated_at,
+#which is a new key, so there is nothing to invalidate and the stale
+#entry just ages out of the LRU. A listing with 500 tiles only renders
+#the tiles that changed since it was last shown.
+
+
+class FragmentCacheExtension(Extension):
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        values = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            values.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        key = [nodes.Const(parser.name), nodes.Const(lineno), nodes.List(values)]
+        return nodes.CallBlock(self.call_method('_render', key), [], [], body) \
+            .set_lineno(lineno)
+
+    def _render(self, template, lineno, values, caller):
+        if not fragment_cache.max_bytes:
+            return caller()
+        key = (template, lineno, tuple(values))
+        fragment = fragment_cache.get(key)
+        if fragment is None:
+            fragment = caller()
+            fragment_cache.set(key, fragment, size=len(fragment))
+        return fragment
@@ -0,0 +1,162 @@
+import heapq
+import json
+import logging
+import re
+import threading
+import time
+from datetime import datetime
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#per request sql instrumentation.
+#
+#Engine events time every statement a request runs (on the primary and
+#the replicas alike). For each request we keep the number of
+#statements, the total time spent in the database and the slowest
+#few statements, and use them three ways:
+#
+#  - in debug mode as X-SQL-Count, X-SQL-Time and X-SQL-Slowest
+#    response headers,
+#  - as json lines in the slow query log (SQL_SLOW_QUERY_LOG) for
+#    every statement slower than SQL_SLOW_QUERY_MS and every request
+#    that spent more than SQL_SLOW_REQUEST_MS in the database,
+#  - as totals per endpoint for this worker, served at /admin/sql.
+#
+#Statements are logged without their parameters, those can hold
+#personal data.
+
+slow_log = logging.getLogger('fyyur.sql')
+
+WHITESPACE = re.compile(r'\s+')
+
+
+class RequestStats:
+    def __init__(self):
+        self.statements = 0
+        self.seconds = 0.0
+        #min-heap of (seconds, statement), the slowest SQL_SLOWEST_KEPT
+        self.slowest = []
+
+
+class RouteStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        #endpoint -> totals
+        self.routes = {}
+
+    def add(self, endpoint, stats):
+        with self.lock:
+            route = self.routes.setdefault(endpoint, {
+                'requests': 0, 'statements': 0, 'statements_max': 0,
+                'db_seconds': 0.0, 'db_seconds_max': 0.0, 'slowest': None})
+            route['requests'] += 1
+            route['statements'] += stats.statements
+            route['statements_max'] = max(route['statements_max'], stats.statements)
+            route['db_seconds'] += stats.seconds
+            route['db_seconds_max'] = max(route['db_seconds_max'], stats.seconds)
+            if stats.slowest:
+                seconds, statement = max(stats.slowest)
+                if route['slowest'] is None or seconds > route['slowest'][0]:
+                    route['slowest'] = (seconds, statement)
+
+    def snapshot(self):
+        with self.lock:
+            return {endpoint: {
+                'requests': route['requests'],
+                'statements_mean': route['statements'] / route['requests'],
+                'statements_max': route['statements_max'],
+                'db_ms_mean': route['db_seconds'] * 1000 / route['requests'],
+                'db_ms_max': route['db_seconds_max'] * 1000,
+                'slowest': route['slowest'] and {
+                    'ms': route['slowest'][0] * 1000,
+                    'statement': route['slowest'][1]},
+            } for endpoint, route in self.routes.items()}
+
+    def reset(self):
+        with self.lock:
+            self.routes.clear()
+
+
+route_stats = RouteStats()
+
+
+def _statement(statement):
+    limit = current_app.config['SQL_LOG_STATEMENT_CHARS']
+    return WHITESPACE.sub(' ', statement).strip()[:limit]
+
+
+def _log(**record):
+    record['time'] = datetime.utcnow().isoformat()
+    slow_log.warning(json.dumps(record, default=str))
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    context._fyyur_started = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _stop_timer(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_fyyur_started', None)
+    if started is None or not has_request_context():
+        return
+    stats = g.get('sql_stats')
+    if stats is None:
+        return
+    seconds = time.perf_counter() - started
+    stats.statements += 1
+    stats.seconds += seconds
+    config = current_app.config
+    if len(stats.slowest) < config['SQL_SLOWEST_KEPT']:
+        heapq.heappush(stats.slowest, (seconds, _statement(statement)))
+    elif seconds > stats.slowest[0][0]:
+        heapq.heapreplace(stats.slowest, (seconds, _statement(statement)))
+    if seconds * 1000 >= config['SQL_SLOW_QUERY_MS']:
+        _log(event='slow_query', endpoint=request.endpoint,
+             method=request.method, path=request.path,
+             ms=round(seconds * 1000, 3), statement=_statement(statement))
+
+
+def _begin_request():
+    g.sql_stats = RequestStats()
+
+
+def _add_headers(response):
+    stats = g.get('sql_stats')
+    if stats is not None and current_app.config['SQL_DEBUG_HEADERS']:
+        response.headers['X-SQL-Count'] = str(stats.statements)
+        response.headers['X-SQL-Time'] = '%.3fms' % (stats.seconds * 1000)
+        if stats.slowest:
+            seconds, statement = max(stats.slowest)
+            response.headers['X-SQL-Slowest'] = '%.3fms %s' % (
+                seconds * 1000, statement[:200])
+    return response
+
+
+def _end_request(exception):
+    #teardown, so streamed responses are counted once they are done
+    stats = g.pop('sql_stats', None)
+    if stats is None or request.endpoint is None:
+        return
+    route_stats.add(request.endpoint, stats)
+    if stats.seconds * 1000 >= current_app.config['SQL_SLOW_REQUEST_MS']:
+        _log(event='slow_request', endpoint=request.endpoint,
+             method=request.method, path=request.path,
+             statements=stats.statements,
+             db_ms=round(stats.seconds * 1000, 3),
+             slowest=[{'ms': round(seconds * 1000, 3), 'statement': statement}
+                      for seconds, statement in sorted(stats.slowest, reverse=True)])
+
+
+def init_sql_instrumentation(app):
+    if not app.config['SQL_INSTRUMENTATION']:
+        return
+    if app.config['SQL_SLOW_QUERY_LOG'] and not slow_log.handlers:
+        handler = logging.FileHandler(app.config['SQL_SLOW_QUERY_LOG'], delay=True)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        slow_log.addHandler(handler)
+        slow_log.setLevel(logging.WARNING)
+    app.before_request(_begin_request)
+    app.after_request(_add_headers)
+    app.teardown_request(_end_request)
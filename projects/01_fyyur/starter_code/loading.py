@@ -0,0 +1,61 @@
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import noload, raiseload, selectinload
+from models import db, Show, Venue, Artist
+
+#relationship loading profiles. The shows relationships are plain
+#lazy='select' in models.py, each route says how much of the graph it
+#needs instead:
+#
+#  listing - the row only, shows are never loaded. Used by listings
+#            and the edit forms.
+#  detail  - the shows and, for each show, the other side (the artist
+#            of a venue's show, the venue of an artist's show) in two
+#            queries, however many shows there are.
+#
+#    venue = Venue.query.options(*load_profile(Venue, 'detail')).get(id)
+#
+#With RAISE_ON_LAZY_LOAD on (the default in debug mode) the listing
+#profile uses raiseload instead of noload and any lazy load that still
+#hits the database raises UnplannedLazyLoad, so a template that
+#quietly starts walking relationships is caught during development.
+
+#relationship from the model to its shows, and from a show to the
+#other side. Names rather than attributes, Show.venue and Show.artist
+#are backrefs and only exist once the mappers are configured.
+DETAIL = {
+    Venue: ('shows', 'artist'),
+    Artist: ('shows', 'venue'),
+}
+
+
+class UnplannedLazyLoad(Exception):
+    pass
+
+
+def _strict():
+    return has_app_context() and current_app.config.get('RAISE_ON_LAZY_LOAD')
+
+
+def load_profile(model, name):
+    shows_name, other_name = DETAIL[model]
+    shows = getattr(model, shows_name)
+    other = getattr(Show, other_name)
+    if name == 'listing':
+        return [raiseload(shows) if _strict() else noload(shows)]
+    if name == 'detail':
+        return [selectinload(shows).joinedload(other)]
+    raise ValueError('unknown loading profile: {}'.format(name))
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _check_lazy_load(orm_execute_state):
+    #lazy_loaded_from is only set for a lazy load that is about to
+    #run sql, loads answered from the identity map never get here.
+    if not orm_execute_state.is_select:
+        return
+    state = orm_execute_state.lazy_loaded_from
+    if state is not None and _strict():
+        raise UnplannedLazyLoad(
+            'unplanned lazy load from {!r}, add it to a loading profile:\n{}'
+            .format(state.obj(), orm_execute_state.statement))
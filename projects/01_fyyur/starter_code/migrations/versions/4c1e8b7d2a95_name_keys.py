@@ -0,0 +1,62 @@
+"""Name keys for duplicate detection.
+
+Revision ID: 4c1e8b7d2a95
+Revises: a6c08e3d52f1
+Create Date: 2026-10-18 17:12:40.518307
+
+"""
+import re
+import unicodedata
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c1e8b7d2a95'
+down_revision = 'a6c08e3d52f1'
+branch_labels = None
+depends_on = None
+
+
+# dedupe.name_key as of this revision
+ARTICLES = {'the', 'a', 'an'}
+WORD = re.compile(r'[^\W_]+')
+
+
+def name_key(name):
+    text = unicodedata.normalize('NFKD', name or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    words = ['and' if word == 'n' else word
+             for word in WORD.findall(text.lower().replace('&', ' and '))]
+    if len(words) > 1 and words[0] in ARTICLES:
+        words = words[1:]
+    if len(words) > 1 and words[-1] in ARTICLES:
+        words = words[:-1]
+    return ' '.join(words)
+
+
+def upgrade():
+    connection = op.get_bind()
+    for table in ('venue', 'artist'):
+        op.add_column(table, sa.Column('name_key', sa.String(), nullable=True))
+        rows = sa.table(table, sa.column('id'), sa.column('name'), sa.column('name_key'))
+        # filled in batches, the index is built afterwards
+        last = 0
+        while True:
+            batch = connection.execute(
+                sa.select(rows.c.id, rows.c.name).where(rows.c.id > last)
+                .order_by(rows.c.id).limit(10000)).fetchall()
+            if not batch:
+                break
+            connection.execute(
+                rows.update().where(rows.c.id == sa.bindparam('row_id'))
+                .values(name_key=sa.bindparam('key')),
+                [{'row_id': row_id, 'key': name_key(name)} for row_id, name in batch])
+            last = batch[-1][0]
+        op.create_index('ix_{}_name_key_trgm'.format(table), table, ['name_key'], unique=False, postgresql_using='gin', postgresql_ops={'name_key': 'gin_trgm_ops'})
+
+
+def downgrade():
+    for table in ('artist', 'venue'):
+        op.drop_index('ix_{}_name_key_trgm'.format(table), table_name=table)
+        op.drop_column(table, 'name_key')
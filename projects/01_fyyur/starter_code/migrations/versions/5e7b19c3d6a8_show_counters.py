@@ -0,0 +1,44 @@
+"""Upcoming/past show counters.
+
+Revision ID: 5e7b19c3d6a8
+Revises: 8c2d41f0a9b3
+Create Date: 2026-10-18 11:20:07.553190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e7b19c3d6a8'
+down_revision = '8c2d41f0a9b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('show', sa.Column('is_upcoming', sa.Boolean(), server_default=sa.false(), nullable=False))
+    op.create_index('ix_show_upcoming_start_time', 'show', ['start_time'], unique=False, postgresql_where=sa.text('is_upcoming'))
+    for table in ('venue', 'artist'):
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+
+    # backfill, the same as counters.rebuild()
+    op.execute('UPDATE show SET is_upcoming = coalesce(start_time > now(), false)')
+    for table in ('venue', 'artist'):
+        op.execute("""
+            UPDATE {0} SET
+                upcoming_shows_count = (SELECT count(*) FROM show
+                    WHERE show.{0}_id = {0}.id AND show.is_upcoming),
+                past_shows_count = (SELECT count(*) FROM show
+                    WHERE show.{0}_id = {0}.id AND NOT show.is_upcoming
+                    AND show.start_time IS NOT NULL)
+        """.format(table))
+
+
+def downgrade():
+    for table in ('artist', 'venue'):
+        op.drop_column(table, 'past_shows_count')
+        op.drop_column(table, 'upcoming_shows_count')
+    op.drop_index('ix_show_upcoming_start_time', table_name='show')
+    op.drop_column('show', 'is_upcoming')
@@ -0,0 +1,61 @@
+"""Search vectors and trigram indexes.
+
+Revision ID: 8c2d41f0a9b3
+Revises: 3f0c9a7be214
+Create Date: 2026-10-18 10:03:54.119208
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '8c2d41f0a9b3'
+down_revision = '3f0c9a7be214'
+branch_labels = None
+depends_on = None
+
+
+# name weighs most, then the location, then the genres. The same
+# weights are used by the in-process fallback in search.py.
+SEARCH_VECTOR = """
+    setweight(to_tsvector('simple', coalesce({row}name, '')), 'A') ||
+    setweight(to_tsvector('simple',
+        coalesce({row}city, '') || ' ' || coalesce({row}state, '')), 'B') ||
+    setweight(to_tsvector('simple',
+        coalesce(array_to_string({row}genres, ' '), '')), 'C')
+"""
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute("""
+        CREATE FUNCTION fyyur_search_vector_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector := {};
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """.format(SEARCH_VECTOR.format(row='NEW.')))
+
+    for table in ('venue', 'artist'):
+        op.add_column(table, sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+        op.execute('UPDATE {} SET search_vector = {}'.format(
+            table, SEARCH_VECTOR.format(row='')))
+        op.execute("""
+            CREATE TRIGGER {0}_search_vector_update
+            BEFORE INSERT OR UPDATE OF name, city, state, genres ON {0}
+            FOR EACH ROW EXECUTE PROCEDURE fyyur_search_vector_update()
+        """.format(table))
+        op.create_index('ix_{}_search_vector'.format(table), table, ['search_vector'], unique=False, postgresql_using='gin')
+        op.create_index('ix_{}_name_trgm'.format(table), table, ['name'], unique=False, postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    for table in ('artist', 'venue'):
+        op.drop_index('ix_{}_name_trgm'.format(table), table_name=table)
+        op.drop_index('ix_{}_search_vector'.format(table), table_name=table)
+        op.execute('DROP TRIGGER {0}_search_vector_update ON {0}'.format(table))
+        op.drop_column(table, 'search_vector')
+    op.execute('DROP FUNCTION fyyur_search_vector_update()')
@@ -0,0 +1,43 @@
+"""NOT NULL keyset pagination keys.
+
+Revision ID: 9b5d3e61c0f7
+Revises: 4c1e8b7d2a95
+Create Date: 2026-10-18 17:40:12.204811
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b5d3e61c0f7'
+down_revision = '4c1e8b7d2a95'
+branch_labels = None
+depends_on = None
+
+
+# the columns the listing pages are keyed on, a NULL in one of them
+# hides every row after it from the next page
+COLUMNS = {
+    'venue': [('name', sa.String()), ('city', sa.String(length=120)),
+              ('state', sa.String(length=120))],
+    'artist': [('name', sa.String())],
+}
+
+
+def upgrade():
+    for table, columns in COLUMNS.items():
+        for column, type_ in columns:
+            op.execute("UPDATE {0} SET {1} = '' WHERE {1} IS NULL".format(table, column))
+            op.alter_column(table, column, existing_type=type_, nullable=False)
+    # every form and the importer require a start time, a show without
+    # one was never counted nor shown on a calendar
+    op.execute('DELETE FROM show WHERE start_time IS NULL')
+    op.alter_column('show', 'start_time', existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade():
+    op.alter_column('show', 'start_time', existing_type=sa.DateTime(), nullable=True)
+    for table, columns in COLUMNS.items():
+        for column, type_ in columns:
+            op.alter_column(table, column, existing_type=type_, nullable=True)
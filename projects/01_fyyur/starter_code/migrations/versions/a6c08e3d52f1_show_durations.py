@@ -0,0 +1,37 @@
+"""Show durations.
+
+Revision ID: a6c08e3d52f1
+Revises: 7d3f5a92c1e8
+Create Date: 2026-10-18 15:48:12.204391
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6c08e3d52f1'
+down_revision = '7d3f5a92c1e8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('show', sa.Column('end_time', sa.DateTime(), nullable=True))
+    # existing shows get the default length (SHOW_DEFAULT_MINUTES)
+    op.execute("UPDATE show SET end_time = start_time + interval '120 minutes' "
+               "WHERE start_time IS NOT NULL")
+    op.create_check_constraint('ck_show_end_after_start', 'show',
+                               'end_time > start_time')
+    # no two shows of a venue may overlap. Fails if the table already
+    # has double bookings, those have to be resolved by hand first.
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    op.execute('ALTER TABLE show ADD CONSTRAINT show_venue_no_overlap '
+               'EXCLUDE USING gist (venue_id WITH =, tsrange(start_time, end_time) WITH &&) '
+               'WHERE (start_time IS NOT NULL AND end_time IS NOT NULL)')
+
+
+def downgrade():
+    op.drop_constraint('show_venue_no_overlap', 'show')
+    op.drop_constraint('ck_show_end_after_start', 'show', type_='check')
+    op.drop_column('show', 'end_time')
@@ -0,0 +1,30 @@
+"""updated_at columns.
+
+Revision ID: b41e6d2f7c05
+Revises: 5e7b19c3d6a8
+Create Date: 2026-10-18 13:41:26.907342
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b41e6d2f7c05'
+down_revision = '5e7b19c3d6a8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # existing rows count as changed now, the first incremental
+    # export after the upgrade is a full one.
+    for table in ('show', 'venue', 'artist'):
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), server_default=sa.text("timezone('utc', now())"), nullable=False))
+        op.create_index(op.f('ix_{}_updated_at'.format(table)), table, ['updated_at'], unique=False)
+
+
+def downgrade():
+    for table in ('artist', 'venue', 'show'):
+        op.drop_index(op.f('ix_{}_updated_at'.format(table)), table_name=table)
+        op.drop_column(table, 'updated_at')
@@ -0,0 +1,27 @@
+"""Show calendar indexes.
+
+Revision ID: e2a7c4f19b63
+Revises: b41e6d2f7c05
+Create Date: 2026-10-18 14:27:05.118264
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2a7c4f19b63'
+down_revision = 'b41e6d2f7c05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # show(start_time) is already covered by ix_show_start_time_id
+    op.create_index('ix_show_venue_id_start_time_id', 'show', ['venue_id', 'start_time', 'id'], unique=False)
+    op.create_index('ix_show_artist_id_start_time_id', 'show', ['artist_id', 'start_time', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_show_artist_id_start_time_id', table_name='show')
+    op.drop_index('ix_show_venue_id_start_time_id', table_name='show')
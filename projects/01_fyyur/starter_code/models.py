@@ -1,6 +1,38 @@
-from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+from routing import RoutingSQLAlchemy
+
+#reads of read-only requests may go to a replica, see routing.py
+db = RoutingSQLAlchemy()
+
+#genres are a postgres ARRAY. sqlite (used for tests) has no arrays,
+#there the same list is stored as JSON.
+Genres = db.ARRAY(db.String).with_variant(db.JSON, 'sqlite')
+#tsvector over name, city, state and genres, filled in by a trigger
+#on postgres (see the search migration) and used by search.py.
+SearchVector = TSVECTOR().with_variant(db.Text, 'sqlite')
+
+
+#the current time in utc on the database side, the server default of
+#updated_at (datetime.utcnow on the python side)
+class utcnow(FunctionElement):
+    type = db.DateTime()
+    inherit_cache = True
+
+
+@compiles(utcnow, 'postgresql')
+def _postgres_utcnow(element, compiler, **kw):
+    return "timezone('utc', now())"
+
+
+@compiles(utcnow)
+def _utcnow(element, compiler, **kw):
+    #sqlite's CURRENT_TIMESTAMP is utc already
+    return 'CURRENT_TIMESTAMP'
+
 
-db = SQLAlchemy()
 #associative Object (different than associative table),
 #connects the venue and artist models
 # to form a many to many relation.
@@ -19,17 +51,45 @@ class Show(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     venue_id = db.Column(db.Integer,
     db.ForeignKey('venue.id'), nullable=False)
-    start_time = db.Column(db.DateTime(), nullable=True)
+    #NOT NULL like every key of a keyset page (see pagination.py)
+    start_time = db.Column(db.DateTime(), nullable=False)
+    #shows of one venue never overlap, on postgres that is enforced by
+    #the show_venue_no_overlap exclusion constraint (see the show
+    #durations migration), see schedule.py for the checks before it
+    end_time = db.Column(db.DateTime(), nullable=True)
+    #which counter of the venue and artist this show is counted in,
+    #maintained by counters.py
+    is_upcoming = db.Column(db.Boolean, nullable=False, default=False,
+    server_default=db.false())
+    #last change (utc), set on insert and on every update, including
+    #the counter updates. Used by incremental exports.
+    updated_at = db.Column(db.DateTime, nullable=False, index=True,
+    default=datetime.utcnow, onupdate=datetime.utcnow,
+    server_default=utcnow())
+
+    #indexes matching the sort keys used by keyset pagination
+    #(see pagination.py), so every page is a short index range scan.
+    __table_args__ = (
+        db.Index('ix_show_start_time_id', 'start_time', 'id'),
+        #date ranges of one venue or one artist (calendar, /shows of a
+        #venue or artist in the api)
+        db.Index('ix_show_venue_id_start_time_id', 'venue_id', 'start_time', 'id'),
+        db.Index('ix_show_artist_id_start_time_id', 'artist_id', 'start_time', 'id'),
+        #only the shows that still have to be rolled over to past
+        db.Index('ix_show_upcoming_start_time', 'start_time',
+                 postgresql_where=db.text('is_upcoming')),
+    )
 
 
 class Venue(db.Model):
     __tablename__ = 'venue'
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String)
-    city = db.Column(db.String(120))
-    genres = db.Column(db.ARRAY(db.String), nullable=False)
-    state = db.Column(db.String(120))
+    #name, city and state are the keys of the /venues pages
+    name = db.Column(db.String, nullable=False)
+    city = db.Column(db.String(120), nullable=False)
+    genres = db.Column(Genres, nullable=False)
+    state = db.Column(db.String(120), nullable=False)
     address = db.Column(db.String(120))
     phone = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
@@ -37,6 +97,18 @@ class Venue(db.Model):
     seeking_talent = db.Column(db.Boolean, default=True)
     seeking_description = db.Column(db.String((120)))
     website_link = db.Column(db.String(500))
+    #the name as compared by duplicate checks, kept by dedupe.py
+    name_key = db.Column(db.String)
+    #deferred so it is never loaded along with the venue
+    search_vector = db.deferred(db.Column(SearchVector))
+    #show counters, kept current by counters.py
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0,
+    server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0,
+    server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False, index=True,
+    default=datetime.utcnow, onupdate=datetime.utcnow,
+    server_default=utcnow())
     #the shows property is set as a relationship to the
     #association table (Show) Be sure to pass db.relationship
     # the model and not the name of the table. Notice 'Show' vs 'shows'.
@@ -44,15 +116,30 @@ class Venue(db.Model):
     #to the Show model. So if you call Show.venue, it will return
     # the venue data associated with that particular show.
     #the lazy prop defines when SQLAlchemy will load data from the db.
+    #it is left at 'select' here, each route picks how shows are loaded
+    #through a loading profile (see loading.py).
     shows = db.relationship('Show',
-    backref=db.backref('venue'),lazy='joined')
+    backref=db.backref('venue'),lazy='select')
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
 
+    __table_args__ = (
+        db.Index('ix_venue_city_state_name_id', 'city', 'state', 'name', 'id'),
+        db.Index('ix_venue_search_vector', 'search_vector',
+                 postgresql_using='gin'),
+        db.Index('ix_venue_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+        #duplicate candidates (name_key % '...', see dedupe.py)
+        db.Index('ix_venue_name_key_trgm', 'name_key', postgresql_using='gin',
+                 postgresql_ops={'name_key': 'gin_trgm_ops'}),
+        #genre filters (genres @> ARRAY[...], see queries.has_genre)
+        db.Index('ix_venue_genres', 'genres', postgresql_using='gin'),
+    )
+
 class Artist(db.Model):
     __tablename__ = 'artist'
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String)
+    name = db.Column(db.String, nullable=False)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
@@ -60,7 +147,29 @@ class Artist(db.Model):
     facebook_link = db.Column(db.String(120))
     seeking_description = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, default=True)
-    genres = db.Column(db.ARRAY(db.String), nullable=False)
+    genres = db.Column(Genres, nullable=False)
     website_link = db.Column(db.String(500))
+    name_key = db.Column(db.String)
+    search_vector = db.deferred(db.Column(SearchVector))
+    #show counters, kept current by counters.py
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0,
+    server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0,
+    server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False, index=True,
+    default=datetime.utcnow, onupdate=datetime.utcnow,
+    server_default=utcnow())
     shows = db.relationship('Show',
-    backref=db.backref('artist'),lazy='joined')
+    backref=db.backref('artist'),lazy='select')
+
+    __table_args__ = (
+        db.Index('ix_artist_name_id', 'name', 'id'),
+        db.Index('ix_artist_search_vector', 'search_vector',
+                 postgresql_using='gin'),
+        db.Index('ix_artist_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_artist_name_key_trgm', 'name_key', postgresql_using='gin',
+                 postgresql_ops={'name_key': 'gin_trgm_ops'}),
+        #genre filters (genres @> ARRAY[...], see queries.has_genre)
+        db.Index('ix_artist_genres', 'genres', postgresql_using='gin'),
+    )
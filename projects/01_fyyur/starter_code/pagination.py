@@ -0,0 +1,101 @@
+import base64
+import json
+from datetime import datetime
+from flask import abort, current_app, has_request_context, request
+from sqlalchemy import tuple_
+
+#keyset (cursor) pagination. Instead of OFFSET, which makes the
+#database walk past every row of the earlier pages, a page remembers
+#the sort key of its first and last row and the next query starts
+#right after it: WHERE (name, id) > (:name, :id) ORDER BY name, id.
+#With an index on the same columns every page costs the same. The
+#key columns must be NOT NULL: a row value compared with a NULL in it
+#is NULL, the rows after such a row would never come up.
+
+
+def encode_cursor(values):
+    #datetimes are not json serializable, tag them so they come back
+    #as datetimes instead of strings.
+    data = [{'dt': value.isoformat()} if isinstance(value, datetime)
+            else value for value in values]
+    raw = json.dumps(data, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        data = json.loads(raw)
+        return [datetime.fromisoformat(value['dt'])
+                if isinstance(value, dict) else value for value in data]
+    except (ValueError, TypeError, KeyError):
+        #a cursor is only ever produced by us, anything we can't read
+        #was edited by hand.
+        abort(400)
+
+
+def _cursor_values(cursor, keys):
+    #a cursor for these keys: as many values as keys, each of the
+    #key's type, or a 400 rather than an error from the database
+    values = decode_cursor(cursor)
+    if not isinstance(values, list) or len(values) != len(keys):
+        abort(400)
+    for value, column in zip(values, keys):
+        if isinstance(value, bool) or not isinstance(value, column.type.python_type):
+            abort(400)
+    return values
+
+
+class Page:
+    def __init__(self, items, next_cursor, prev_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        #the other query string arguments (filters etc.) are carried
+        #over to the next/prev links.
+        self.args = {}
+        if has_request_context():
+            self.args = {key: value for key, value in request.args.items()
+                         if key not in ('after', 'before')}
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def keyset_page(query, keys, after=None, before=None, per_page=None):
+    #query is a column projection without an order_by, keys are the
+    #columns that make up the (unique) sort key, e.g.
+    #[Artist.name, Artist.id]. Every key must also be selected by the
+    #query under its own name so we can read it back from the rows.
+    if per_page is None:
+        per_page = current_app.config['PAGE_SIZE']
+    key = tuple_(*keys)
+
+    if before is not None:
+        #walking backwards: take the rows just before the cursor in
+        #reverse order, then flip them back.
+        rows = query.filter(key < tuple_(*_cursor_values(before, keys))).order_by(
+            *[column.desc() for column in keys]).limit(per_page + 1).all()
+        more = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        has_prev, has_next = more, True
+    else:
+        if after is not None:
+            query = query.filter(key > tuple_(*_cursor_values(after, keys)))
+        rows = query.order_by(*keys).limit(per_page + 1).all()
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        has_prev = after is not None
+
+    def cursor_of(row):
+        return encode_cursor([getattr(row, column.key) for column in keys])
+
+    return Page(
+        rows,
+        cursor_of(rows[-1]) if rows and has_next else None,
+        cursor_of(rows[0]) if rows and has_prev else None)
@@ -0,0 +1,184 @@
+import cProfile
+import json
+import os
+import pstats
+import random
+import re
+import time
+import uuid
+from datetime import datetime
+from flask import current_app, g, request
+from itsdangerous import BadSignature, TimestampSigner
+
+#on demand request profiling.
+#
+#A request is profiled with cProfile when it carries a valid
+#X-Profile header (a token from /admin/profiles/token, signed with
+#PROFILE_SECRET and valid for a limited time) or when it is picked by
+#PROFILE_SAMPLE_RATE. Everything else pays nothing but a header lookup.
+#
+#Each profile is written to PROFILE_DIR as <id>.prof (pstats, open it
+#with snakeviz or turn it into a flame graph with flameprof) next to
+#<id>.json, a summary that splits the request's time into database,
+#template rendering and python. The directory is a ring: only the
+#newest PROFILE_MAX_FILES profiles are kept. The profile id comes back
+#in the X-Profile-Id header, /admin/profiles lists and serves them.
+
+SALT = 'fyyur-profile'
+PROFILE_ID = re.compile(r'[0-9T]+-[0-9a-f]+')
+
+#where the split finds database and template time in the profile
+DB_FUNCTIONS = {'do_execute', 'do_executemany', 'do_execute_no_params'}
+TEMPLATE_FUNCTIONS = {'_render'}
+
+
+def _signer(app):
+    secret = app.config['PROFILE_SECRET']
+    return TimestampSigner(secret, salt=SALT) if secret else None
+
+
+def make_token(app):
+    #value for the X-Profile header
+    signer = _signer(app)
+    return signer.sign('profile').decode() if signer else None
+
+
+def _wanted(app):
+    token = request.headers.get('X-Profile')
+    if token:
+        signer = _signer(app)
+        if signer is not None:
+            try:
+                signer.unsign(token, max_age=app.config['PROFILE_TOKEN_MAX_AGE'])
+                return True
+            except BadSignature:
+                pass
+    rate = app.config['PROFILE_SAMPLE_RATE']
+    return rate > 0 and random.random() < rate
+
+
+def _profile_id():
+    return '{}-{}'.format(
+        datetime.utcnow().strftime('%Y%m%dT%H%M%S'), uuid.uuid4().hex[:8])
+
+
+def _start():
+    if not _wanted(current_app):
+        return
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        #another profiler is already running in this thread
+        return
+    g.profile = (profile, time.perf_counter())
+
+
+def _status(response):
+    if 'profile' in g:
+        g.profile_status = response.status_code
+        g.profile_id = _profile_id()
+        response.headers['X-Profile-Id'] = g.profile_id
+    return response
+
+
+def _finish(exception):
+    #teardown, after a streamed response has been sent as well
+    profile_started = g.pop('profile', None)
+    if profile_started is None:
+        return
+    profile, started = profile_started
+    profile.disable()
+    total = time.perf_counter() - started
+    profile_id = g.get('profile_id') or _profile_id()
+    try:
+        save(current_app, profile_id, profile, summarize(profile, total, {
+            'id': profile_id,
+            'time': datetime.utcnow().isoformat(),
+            'method': request.method,
+            'path': request.full_path,
+            'endpoint': request.endpoint,
+            'status': g.get('profile_status', 500 if exception else None),
+        }))
+    except OSError as e:
+        current_app.logger.warning('could not save profile %s: %s', profile_id, e)
+
+
+def _function_name(key):
+    filename, line, name = key
+    return '{}:{}({})'.format(filename, line, name)
+
+
+def summarize(profile, total, summary):
+    stats = pstats.Stats(profile)
+    db = template = 0.0
+    for (filename, _, name), (_, _, _, cumtime, _) in stats.stats.items():
+        if name in DB_FUNCTIONS and 'sqlalchemy' in filename:
+            db += cumtime
+        elif name in TEMPLATE_FUNCTIONS and filename.endswith(os.path.join('flask', 'templating.py')):
+            template += cumtime
+    top = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+    summary.update(
+        total_ms=round(total * 1000, 3),
+        db_ms=round(db * 1000, 3),
+        #templates don't query (the loading profiles see to that), so
+        #the two don't overlap
+        template_ms=round(template * 1000, 3),
+        top=[{
+            'function': _function_name(key),
+            'calls': calls,
+            'tottime_ms': round(tottime * 1000, 3),
+            'cumtime_ms': round(cumtime * 1000, 3),
+        } for key, (_, calls, tottime, cumtime, _) in top[:25]])
+    summary['python_ms'] = round(
+        max(summary['total_ms'] - summary['db_ms'] - summary['template_ms'], 0), 3)
+    return summary
+
+
+def profile_dir(app):
+    return os.path.join(app.root_path, app.config['PROFILE_DIR'])
+
+
+def save(app, profile_id, profile, summary):
+    directory = profile_dir(app)
+    os.makedirs(directory, exist_ok=True)
+    profile.dump_stats(os.path.join(directory, profile_id + '.prof'))
+    with open(os.path.join(directory, profile_id + '.json'), 'w') as f:
+        json.dump(summary, f)
+    _trim(directory, app.config['PROFILE_MAX_FILES'])
+
+
+def _trim(directory, keep):
+    #ids start with the time, so sorting them sorts by age
+    ids = sorted(name[:-len('.json')] for name in os.listdir(directory)
+                 if name.endswith('.json'))
+    for profile_id in ids[:-keep] if keep else ids:
+        for extension in ('.json', '.prof'):
+            try:
+                os.remove(os.path.join(directory, profile_id + extension))
+            except FileNotFoundError:
+                #another worker got there first
+                pass
+
+
+def list_profiles(app):
+    directory = profile_dir(app)
+    if not os.path.isdir(directory):
+        return []
+    summaries = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if name.endswith('.json'):
+            try:
+                with open(os.path.join(directory, name)) as f:
+                    summary = json.load(f)
+            except (OSError, ValueError):
+                continue
+            summary.pop('top', None)
+            summaries.append(summary)
+    return summaries
+
+
+def init_profiling(app):
+    app.before_request(_start)
+    app.after_request(_status)
+    app.teardown_request(_finish)
@@ -0,0 +1,245 @@
+import calendar
+import json
+import re
+from datetime import date, datetime, timedelta
+from functools import wraps
+from itertools import groupby
+from flask import abort, current_app
+from flask_sqlalchemy import get_debug_queries
+from sqlalchemy import func, true
+from cache import cached_value
+from models import db, Show, Venue, Artist
+from pagination import keyset_page
+
+#read paths for the listing pages. Each function here asks the
+#database for exactly the columns a template needs, so the cost of
+#a page grows with the rows it shows and not with the size of the
+#show table. Listings are paged with keyset_page, after/before are
+#the cursors from the query string.
+
+
+def venue_areas(after=None, before=None, genre=None):
+    #every venue with its number of upcoming shows. The count is the
+    #upcoming_shows_count counter (see counters.py), so this is a
+    #plain index scan over venue and never touches the show table.
+    query = db.session.query(
+        Venue.city,
+        Venue.state,
+        Venue.id,
+        Venue.name,
+        Venue.upcoming_shows_count.label('num_upcoming_shows'),
+        Venue.updated_at
+    )
+    if genre:
+        query = query.filter(has_genre(Venue.genres, genre))
+    #the page is keyed on (city, state, name, id) rather than just
+    #(name, id) so venues of one area stay next to each other across
+    #page boundaries.
+    page = keyset_page(query, [Venue.city, Venue.state, Venue.name, Venue.id],
+                       after=after, before=before)
+
+    #rows are already sorted by area, so grouping them is a single
+    #linear pass instead of an areas x venues scan.
+    page.items = [{
+        'city': city,
+        'state': state,
+        'venues': [{
+            'id': row.id,
+            'name': row.name,
+            'num_upcoming_shows': row.num_upcoming_shows,
+            'updated_at': row.updated_at
+        } for row in venues]
+    } for (city, state), venues in groupby(
+        page.items, key=lambda row: (row.city, row.state))]
+    return page
+
+
+def artist_listing(after=None, before=None, genre=None):
+    query = db.session.query(Artist.id, Artist.name, Artist.updated_at)
+    if genre:
+        query = query.filter(has_genre(Artist.genres, genre))
+    return keyset_page(query, [Artist.name, Artist.id],
+                       after=after, before=before)
+
+
+def show_listing(after=None, before=None):
+    #a single joined, column-only query for the /shows page. Before
+    #this every show cost two extra round trips (Venue.query.get and
+    #Artist.query.get), now the page is one statement no matter how
+    #many shows there are.
+    query = db.session.query(
+        Show.id,
+        Show.venue_id,
+        Venue.name.label('venue_name'),
+        Show.artist_id,
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link'),
+        Show.start_time,
+        Show.updated_at,
+        Venue.updated_at.label('venue_updated_at'),
+        Artist.updated_at.label('artist_updated_at')
+    ).join(
+        Venue, Show.venue_id == Venue.id
+    ).join(
+        Artist, Show.artist_id == Artist.id
+    )
+    page = keyset_page(query, [Show.start_time, Show.id],
+                       after=after, before=before)
+
+    page.items = [{
+        'id': row.id,
+        'venue_id': row.venue_id,
+        'venue_name': row.venue_name,
+        'artist_id': row.artist_id,
+        'artist_name': row.artist_name,
+        'artist_image_link': row.artist_image_link,
+        'start_time': row.start_time,
+        #the keys of the cached tile
+        'updated_at': row.updated_at,
+        'venue_updated_at': row.venue_updated_at,
+        'artist_updated_at': row.artist_updated_at
+    } for row in page.items]
+    return page
+
+
+def has_genre(column, genre):
+    #genres is a postgres ARRAY, `@>` can use a GIN index there. On
+    #sqlite the list is stored as json text, look for the quoted name
+    #(json escapes the quotes inside it, LIKE needs %, _ and \ escaped).
+    if db.engine.dialect.name == 'postgresql':
+        return column.contains([genre])
+    quoted = re.sub(r'([%_\\])', r'\\\1', json.dumps(genre))
+    return db.cast(column, db.Text).like('%' + quoted + '%', escape='\\')
+
+
+#the listing tag of each model, facet counts are dropped together with
+#the listing pages whenever a venue or artist is created, edited or
+#deleted
+LISTING_TAGS = {Venue: 'venues', Artist: 'artists'}
+
+
+def genre_facets(model):
+    #[(genre, number of venues/artists)], most common first
+    return cached_value(('genre_facets', model.__tablename__),
+                        lambda: _genre_counts(model),
+                        tags=(LISTING_TAGS[model],))
+
+
+def _genre_counts(model):
+    #one aggregate over the genres of every row: unnest() on postgres,
+    #json_each() over the json text on sqlite
+    if db.engine.dialect.name == 'postgresql':
+        genres = db.session.query(
+            func.unnest(model.genres).label('genre')).subquery()
+        genre = genres.c.genre
+        query = db.session.query(genre, func.count())
+    else:
+        genres = func.json_each(model.genres).table_valued('value')
+        genre = genres.c.value
+        query = db.session.query(genre, func.count()).select_from(
+            model).join(genres, true())
+    rows = query.group_by(genre).all()
+    return sorted(((name, count) for name, count in rows),
+                  key=lambda row: (-row[1], row[0]))
+
+
+def shows_between(columns, start, end, venue_id=None, artist_id=None,
+                  city=None, state=None, genre=None):
+    #shows with start <= start_time < end, joined to their venue and
+    #artist, narrowed down by any of the optional filters. The range
+    #is served by show(start_time, id), or by show(venue_id,
+    #start_time) / show(artist_id, start_time) when a venue or artist
+    #is given, so the cost follows the size of the result.
+    query = db.session.query(*columns).join(
+        Venue, Show.venue_id == Venue.id
+    ).join(
+        Artist, Show.artist_id == Artist.id
+    ).filter(Show.start_time >= start, Show.start_time < end)
+    if venue_id is not None:
+        query = query.filter(Show.venue_id == venue_id)
+    if artist_id is not None:
+        query = query.filter(Show.artist_id == artist_id)
+    if city:
+        query = query.filter(Venue.city == city)
+    if state:
+        query = query.filter(Venue.state == state)
+    if genre:
+        query = query.filter(has_genre(Artist.genres, genre))
+    return query
+
+
+def calendar_filters(args):
+    #the optional filters of the calendar (html and api) from a query
+    #string
+    return {
+        'venue_id': args.get('venue_id', type=int),
+        'artist_id': args.get('artist_id', type=int),
+        'city': args.get('city', '').strip() or None,
+        'state': args.get('state', '').strip() or None,
+        'genre': args.get('genre', '').strip() or None,
+    }
+
+
+def parse_day(value, default):
+    #a YYYY-MM-DD query string value as a datetime at midnight
+    if not value:
+        return default
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        abort(400)
+
+
+def calendar_month(year, month, **filters):
+    #the weeks of a month view (monday first, including the days of
+    #the previous and next month that fill the first and last week),
+    #with the shows of every day. A single range query over the days
+    #on the page, capped at CALENDAR_MAX_SHOWS.
+    weeks = calendar.Calendar().monthdatescalendar(year, month)
+    start = datetime.combine(weeks[0][0], datetime.min.time())
+    end = datetime.combine(weeks[-1][-1] + timedelta(days=1), datetime.min.time())
+    limit = current_app.config['CALENDAR_MAX_SHOWS']
+    rows = shows_between([
+        Show.id,
+        Show.start_time,
+        Show.venue_id,
+        Venue.name.label('venue_name'),
+        Show.artist_id,
+        Artist.name.label('artist_name'),
+    ], start, end, **filters).order_by(
+        Show.start_time, Show.id).limit(limit + 1).all()
+
+    by_day = {}
+    for row in rows[:limit]:
+        by_day.setdefault(row.start_time.date(), []).append(row)
+    weeks = [[{
+        'date': day,
+        'in_month': day.month == month,
+        'today': day == date.today(),
+        'shows': by_day.get(day, []),
+    } for day in week] for week in weeks]
+    return weeks, rows[:limit], len(rows) > limit
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(max_queries):
+    #decorator for routes that must run a fixed number of sql
+    #statements. It relies on flask_sqlalchemy's query recording,
+    #which is switched on by SQLALCHEMY_RECORD_QUERIES in config.py,
+    #so in production (recording off) this check costs nothing.
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            response = view(*args, **kwargs)
+            queries = get_debug_queries()
+            if len(queries) > max_queries:
+                raise QueryBudgetExceeded(
+                    '%s ran %d queries, budget is %d:\n%s' % (
+                        view.__name__, len(queries), max_queries,
+                        '\n'.join(q.statement for q in queries)))
+            return response
+        return wrapper
+    return decorator
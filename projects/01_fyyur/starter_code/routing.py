@@ -0,0 +1,77 @@
+import random
+import time
+from flask import current_app, has_request_context, request, session
+from flask_sqlalchemy import SignallingSession, SQLAlchemy, get_state
+from sqlalchemy import event, orm
+from sqlalchemy.sql import Select
+
+#read replica routing.
+#
+#Requests that only read (GET/HEAD and the endpoints listed in
+#REPLICA_READ_ENDPOINTS, e.g. the POSTed searches) send their SELECTs
+#to one of the REPLICA_BINDS, picked once per request. Everything
+#else goes to the primary: writes, flushes, SELECT ... FOR UPDATE,
+#raw sql, cli commands, and every statement of a request after its
+#first write.
+#
+#Replicas lag a little. A client that just committed something keeps
+#reading from the primary for REPLICA_STICKY_SECONDS (a timestamp in
+#its session cookie), so the redirect after an edit shows the edit.
+#The page cache (cache.py) is skipped for it as well, a cached page
+#may have been rendered from a replica that hadn't caught up.
+#
+#Without replicas configured this is a plain SignallingSession.
+
+
+def _reads_only():
+    return request.method in ('GET', 'HEAD') or \
+        request.endpoint in current_app.config['REPLICA_READ_ENDPOINTS']
+
+
+def sticky():
+    return session.get('primary_until', 0) > time.time()
+
+
+def _is_read(clause):
+    return isinstance(clause, Select) and clause._for_update_arg is None
+
+
+class RoutingSession(SignallingSession):
+    def __init__(self, db, **options):
+        #None until the first read decides, then an engine or False
+        self.replica = None
+        #set by the first statement that has to go to the primary
+        self.wrote = False
+        SignallingSession.__init__(self, db, **options)
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if not self.wrote and not self._flushing and _is_read(clause):
+            replica = self._replica()
+            if replica:
+                return replica
+        elif mapper is not None or clause is not None:
+            self.wrote = True
+        return SignallingSession.get_bind(self, mapper, clause)
+
+    def _replica(self):
+        if self.replica is None:
+            self.replica = False
+            binds = self.app.config['REPLICA_BINDS']
+            if binds and has_request_context() and _reads_only() and not sticky():
+                self.replica = get_state(self.app).db.get_engine(
+                    self.app, bind=random.choice(binds))
+        return self.replica
+
+
+def _stick_to_primary(db_session):
+    if db_session.wrote and has_request_context() and \
+            db_session.app.config['REPLICA_BINDS']:
+        session['primary_until'] = time.time() + \
+            db_session.app.config['REPLICA_STICKY_SECONDS']
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        factory = orm.sessionmaker(class_=RoutingSession, db=self, **options)
+        event.listen(factory, 'after_commit', _stick_to_primary)
+        return factory
@@ -0,0 +1,177 @@
+from collections import OrderedDict
+from datetime import timedelta
+from flask import current_app
+from models import db, Show
+
+#double booking checks: two shows of one venue must not overlap.
+#
+#Shows are half open intervals [start_time, end_time), back to back
+#shows are fine. Because the shows of a venue never overlap, sorting
+#them by start_time sorts them by end_time as well, and the only show
+#that can collide with a new one is the last show starting before the
+#new one ends. Finding it is one step down the (venue_id, start_time)
+#index, so the check costs O(log n) however many shows the venue has.
+#
+#On postgres the show_venue_no_overlap exclusion constraint is the
+#final word (it also catches two requests racing each other), these
+#checks give a readable error before the insert.
+
+
+def show_end(start_time, end_time=None):
+    #shows created without an end time last SHOW_DEFAULT_MINUTES
+    if end_time is not None or start_time is None:
+        return end_time
+    return start_time + timedelta(minutes=current_app.config['SHOW_DEFAULT_MINUTES'])
+
+
+def find_conflict(venue_id, start_time, end_time):
+    #the show of the venue overlapping [start_time, end_time), or None
+    row = db.session.query(Show.id, Show.start_time, Show.end_time).filter(
+        Show.venue_id == venue_id, Show.start_time < end_time
+    ).order_by(Show.start_time.desc(), Show.id.desc()).first()
+    if row is not None and row.end_time is not None and row.end_time > start_time:
+        return row
+    return None
+
+
+class _Node:
+    __slots__ = ('start', 'end', 'max_end', 'height', 'left', 'right')
+
+    def __init__(self, start, end, left=None, right=None):
+        self.start = start
+        self.end = end
+        self.left = left
+        self.right = right
+        self._update()
+
+    def _update(self):
+        self.height = 1 + max(_height(self.left), _height(self.right))
+        self.max_end = max([self.end] + [child.max_end for child in
+                                         (self.left, self.right) if child is not None])
+
+
+def _height(node):
+    return node.height if node is not None else 0
+
+
+def _rotate_right(node):
+    top = node.left
+    node.left = top.right
+    node._update()
+    top.right = node
+    top._update()
+    return top
+
+
+def _rotate_left(node):
+    top = node.right
+    node.right = top.left
+    node._update()
+    top.left = node
+    top._update()
+    return top
+
+
+def _insert(node, start, end):
+    if node is None:
+        return _Node(start, end)
+    if start < node.start:
+        node.left = _insert(node.left, start, end)
+    else:
+        node.right = _insert(node.right, start, end)
+    node._update()
+    balance = _height(node.left) - _height(node.right)
+    if balance > 1:
+        if _height(node.left.left) < _height(node.left.right):
+            node.left = _rotate_left(node.left)
+        return _rotate_right(node)
+    if balance < -1:
+        if _height(node.right.right) < _height(node.right.left):
+            node.right = _rotate_right(node.right)
+        return _rotate_left(node)
+    return node
+
+
+def _build(intervals, low, high):
+    #a balanced tree of intervals[low:high], sorted by start
+    if low >= high:
+        return None
+    middle = (low + high) // 2
+    return _Node(*intervals[middle], left=_build(intervals, low, middle),
+                 right=_build(intervals, middle + 1, high))
+
+
+class IntervalTree:
+    #half open [start, end) intervals in an AVL tree ordered by start,
+    #every node knowing the latest end below it. Inserting and finding
+    #an overlap are both O(log n), also when the stored intervals
+    #overlap each other (shows from before the checks existed).
+    def __init__(self, intervals=()):
+        intervals = sorted(intervals)
+        self.root = _build(intervals, 0, len(intervals))
+        self.size = len(intervals)
+
+    def __len__(self):
+        return self.size
+
+    def add(self, start, end):
+        self.root = _insert(self.root, start, end)
+        self.size += 1
+
+    def overlaps(self, start, end):
+        #if an overlapping interval is in the left subtree, or none
+        #is: the left one ending latest starts after end, and so does
+        #everything to the right of it
+        node = self.root
+        while node is not None:
+            if node.start < end and node.end > start:
+                return True
+            if node.left is not None and node.left.max_end > start:
+                node = node.left
+            else:
+                node = node.right
+        return False
+
+
+class VenueSchedule:
+    #the same check for bulk imports, in memory. The shows of a venue
+    #are loaded (one indexed range query) the first time the venue
+    #comes up and kept in an IntervalTree.
+    #
+    #With max_shows, trim() forgets the venues least recently checked
+    #until at most that many shows are kept, so a long import doesn't
+    #hold every show of every venue it touched. A forgotten venue is
+    #loaded again from the database, so trim() may only be called once
+    #everything add()ed is written.
+    def __init__(self, max_shows=None):
+        self.max_shows = max_shows
+        #venue_id -> IntervalTree, least recently used first
+        self.venues = OrderedDict()
+        #shows in self.venues
+        self.size = 0
+
+    def _load(self, venue_id):
+        if venue_id not in self.venues:
+            rows = db.session.query(Show.start_time, Show.end_time).filter(
+                Show.venue_id == venue_id, Show.start_time.isnot(None),
+                Show.end_time.isnot(None)).all()
+            self.venues[venue_id] = IntervalTree(
+                (row.start_time, row.end_time) for row in rows)
+            self.size += len(rows)
+        else:
+            self.venues.move_to_end(venue_id)
+        return self.venues[venue_id]
+
+    def trim(self):
+        if self.max_shows is None:
+            return
+        while self.size > self.max_shows:
+            _, tree = self.venues.popitem(last=False)
+            self.size -= len(tree)
+
+    def conflicts(self, venue_id, start_time, end_time):
+        return self._load(venue_id).overlaps(start_time, end_time)
+
+    def add(self, venue_id, start_time, end_time):
+        self._load(venue_id).add(start_time, end_time)
+        self.size += 1
@@ -0,0 +1,196 @@
+import re
+from bisect import bisect_left, insort
+from flask import current_app
+from sqlalchemy import event, func, or_
+from models import db, Venue, Artist
+from queries import has_genre
+
+#ranked search over venues and artists (name, city, state, genres).
+#
+#On postgres this uses the search_vector tsvector column (kept up to
+#date by a trigger, see the search migration) and a pg_trgm GIN index
+#on name, so neither the full text match nor the '%term%' substring
+#match needs a sequential scan.
+#
+#Other databases (the sqlite databases used for tests) get an
+#in-process inverted index with the same ranking rules, so
+#ranked_search behaves the same everywhere.
+
+#field weights, the same ones the trigger gives setweight (A, B, C)
+NAME, PLACE, GENRE = 3, 2, 1
+
+TOKEN = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return TOKEN.findall((text or '').lower())
+
+
+def ranked_search(model, term, limit=None, genre=None):
+    if limit is None:
+        limit = current_app.config['SEARCH_RESULT_LIMIT']
+    if db.engine.dialect.name == 'postgresql':
+        rows = _postgres_search(model, term, limit, genre)
+    else:
+        rows = _index_for(model).search(term, limit, genre)
+    return [{'id': row_id, 'name': name} for row_id, name in rows]
+
+
+def _postgres_search(model, term, limit, genre=None):
+    tokens = tokenize(term)
+    query = db.session.query(model.id, model.name)
+    if genre:
+        query = query.filter(has_genre(model.genres, genre))
+    if not tokens:
+        return query.order_by(model.name, model.id).limit(limit).all()
+
+    #every word has to match, the last one may be a prefix of a
+    #word ("musi" finds "Musical")
+    tsquery = func.to_tsquery(
+        'simple', ' & '.join(tokens[:-1] + [tokens[-1] + ':*']))
+    pattern = '%' + re.sub(r'([%_\\])', r'\\\1', term.strip()) + '%'
+    rank = (func.ts_rank(model.search_vector, tsquery)
+            + func.similarity(model.name, term))
+    return query.filter(or_(
+        model.search_vector.op('@@')(tsquery),
+        model.name.ilike(pattern)
+    )).order_by(rank.desc(), model.id).limit(limit).all()
+
+
+class InvertedIndex:
+    def __init__(self):
+        #token -> {id: weight}
+        self.postings = {}
+        #sorted vocabulary, so prefixes can be looked up with bisect
+        self.vocabulary = []
+        self.names = {}
+        self.genres = {}
+        self.documents = {}
+
+    def add(self, row_id, name, city, state, genres):
+        self.remove(row_id)
+        weights = {}
+        for weight, text in ((NAME, name), (PLACE, city), (PLACE, state),
+                             (GENRE, ' '.join(genres or []))):
+            for token in tokenize(text):
+                weights[token] = max(weights.get(token, 0), weight)
+        for token, weight in weights.items():
+            if token not in self.postings:
+                self.postings[token] = {}
+                insort(self.vocabulary, token)
+            self.postings[token][row_id] = weight
+        self.names[row_id] = name
+        self.genres[row_id] = frozenset(genres or ())
+        self.documents[row_id] = list(weights)
+
+    def remove(self, row_id):
+        for token in self.documents.pop(row_id, []):
+            self.postings[token].pop(row_id, None)
+        self.names.pop(row_id, None)
+        self.genres.pop(row_id, None)
+
+    def _matches(self, token):
+        #exact matches only, with the same bonus as in _prefix_matches
+        return {row_id: weight + 0.5
+                for row_id, weight in self.postings.get(token, {}).items()}
+
+    def _prefix_matches(self, prefix):
+        #all ids with a token starting with prefix, with the best
+        #weight they got for it. An exact token beats a prefix match.
+        matches = {}
+        start = bisect_left(self.vocabulary, prefix)
+        for token in self.vocabulary[start:]:
+            if not token.startswith(prefix):
+                break
+            bonus = 0.5 if token == prefix else 0
+            for row_id, weight in self.postings[token].items():
+                matches[row_id] = max(matches.get(row_id, 0), weight + bonus)
+        return matches
+
+    def search(self, term, limit, genre=None):
+        tokens = tokenize(term)
+        if not tokens:
+            rows = sorted(self.names.items(), key=lambda item: (item[1] or '', item[0]))
+            if genre:
+                rows = [row for row in rows if genre in self.genres[row[0]]]
+            return rows[:limit]
+
+        scores = None
+        for i, token in enumerate(tokens):
+            #like the tsquery on postgres: only the last word, which may
+            #still be being typed, is a prefix
+            if i == len(tokens) - 1:
+                matches = self._prefix_matches(token)
+            else:
+                matches = self._matches(token)
+            if scores is None:
+                scores = matches
+            else:
+                scores = {row_id: score + matches[row_id]
+                          for row_id, score in scores.items()
+                          if row_id in matches}
+            if not scores:
+                return []
+        if genre:
+            scores = {row_id: score for row_id, score in scores.items()
+                      if genre in self.genres[row_id]}
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [(row_id, self.names[row_id]) for row_id, _ in ranked[:limit]]
+
+
+_indexes = {}
+
+
+def _index_for(model):
+    #built on first use from a single column-only query, afterwards
+    #kept current by the session hooks below.
+    if model not in _indexes:
+        index = InvertedIndex()
+        for row in db.session.query(model.id, model.name, model.city,
+                                    model.state, model.genres):
+            index.add(*row)
+        _indexes[model] = index
+    return _indexes[model]
+
+
+def reset():
+    #drop the in-process indexes, e.g. after a bulk import that
+    #bypassed the session.
+    _indexes.clear()
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_changes(session, flush_context):
+    pending = session.info.setdefault('search_pending', [])
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, (Venue, Artist)):
+            pending.append((type(obj), obj.id, (
+                obj.name, obj.city, obj.state, obj.genres)))
+    for obj in session.deleted:
+        if isinstance(obj, (Venue, Artist)):
+            pending.append((type(obj), obj.id, None))
+
+
+@event.listens_for(db.session, 'after_commit')
+def _apply_changes(session):
+    for model, row_id, document in session.info.pop('search_pending', []):
+        index = _indexes.get(model)
+        if index is None:
+            continue
+        if document is None:
+            index.remove(row_id)
+        else:
+            index.add(row_id, *document)
+
+
+@event.listens_for(db.session, 'after_bulk_delete')
+def _forget_bulk_delete(delete_context):
+    #Query.delete() doesn't tell us which rows went away, so the
+    #index is rebuilt on next use instead.
+    entity = delete_context.query.column_descriptions[0]['entity']
+    _indexes.pop(entity, None)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('search_pending', None)
@@ -0,0 +1,222 @@
+import random
+import time
+from bisect import bisect
+from datetime import datetime, timedelta
+from itertools import accumulate, islice
+from sqlalchemy import func, text
+from bulk import copy_rows, count_shows
+from dedupe import name_key
+from forms import genres_choices, state_choices
+from models import db, Show, Venue, Artist
+import search
+
+#deterministic synthetic venues, artists and shows, for reproducing
+#production sized problems locally (`flask fyyur generate`) and for
+#bench.py.
+#
+#Everything is drawn from a random.Random seeded with the --seed and
+#the first id of the run, so the same seed on the same database
+#always produces the same rows, and a second run adds new rows after
+#the existing ones instead of repeating them. Show times are counted
+#from a fixed start (START, or --start) rather than from today, only
+#is_upcoming depends on when the rows are written. Popularity is skewed:
+#states, cities and genres follow a zipf like curve, and a few venues
+#and artists (pareto weights) get most of the shows. Shows of a venue
+#never overlap, each venue's next show starts after its last one.
+#
+#Rows are written in batches, COPY on postgres and executemany
+#elsewhere, with the show counters updated per batch.
+
+ADJECTIVES = (
+    'Blue', 'Red', 'Golden', 'Silver', 'Velvet', 'Electric', 'Wild',
+    'Musical', 'Midnight', 'Lucky', 'Broken', 'Happy', 'Crimson',
+    'Hidden', 'Rusty', 'Neon', 'Lonely', 'Iron', 'Painted', 'Sunny',
+    'Crystal', 'Black', 'Little', 'Grand', 'Secret', 'Dusty', 'Royal',
+)
+NOUNS = (
+    'Hop', 'Room', 'Lounge', 'Hall', 'Garage', 'Cellar', 'Barn', 'Club',
+    'Saloon', 'Tavern', 'Den', 'Stage', 'Theater', 'Attic', 'Warehouse',
+    'Cafe', 'Parlor', 'Station', 'Factory', 'Chapel', 'Harbor', 'Loft',
+)
+BAND_NOUNS = (
+    'Petals', 'Wolves', 'Saxophones', 'Rebels', 'Echoes', 'Strangers',
+    'Horses', 'Sparrows', 'Machines', 'Riders', 'Shadows', 'Tigers',
+    'Ghosts', 'Pilots', 'Giants', 'Owls', 'Kings', 'Comets', 'Foxes',
+)
+CITIES = (
+    'Springfield', 'Franklin', 'Greenville', 'Bristol', 'Clinton',
+    'Fairview', 'Salem', 'Madison', 'Georgetown', 'Arlington', 'Ashland',
+    'Dover', 'Oxford', 'Jackson', 'Burlington', 'Manchester', 'Milton',
+    'Newport', 'Auburn', 'Dayton', 'Lexington', 'Milford', 'Riverside',
+)
+SHOW_LENGTHS = (90, 120, 120, 150, 180)
+#when the first show of a venue without shows starts
+START = datetime(2026, 1, 1)
+
+
+def zipf_weights(n, s=1.0):
+    return [1 / (rank ** s) for rank in range(1, n + 1)]
+
+
+class Picker:
+    #weighted choice in O(log n), for drawing millions of times from
+    #the same population
+    def __init__(self, population, weights):
+        self.population = list(population)
+        self.cumulative = list(accumulate(weights))
+
+    def __call__(self, rng):
+        return self.population[bisect(
+            self.cumulative, rng.random() * self.cumulative[-1])]
+
+
+def _skewed(rng, population, s=1.0):
+    #zipf over the population in a seeded order
+    population = list(population)
+    rng.shuffle(population)
+    return Picker(population, zipf_weights(len(population), s))
+
+
+def _popularity(rng, ids):
+    #pareto weights (80/20), capped so one venue can't take everything
+    return Picker(ids, [min(rng.paretovariate(1.16), 50) for _ in ids])
+
+
+class Generator:
+    def __init__(self, seed=0, batch_size=10000, echo=None, start=START):
+        self.seed = seed
+        self.start = start
+        self.batch_size = batch_size
+        self.echo = echo or (lambda message: None)
+        self.postgres = db.engine.dialect.name == 'postgresql'
+        rng = random.Random('{}:pickers'.format(seed))
+        self.state = _skewed(rng, [value for value, _ in state_choices])
+        self.city = _skewed(rng, CITIES)
+        self.genre = _skewed(rng, [value for value, _ in genres_choices])
+
+    def _rng(self, kind, first_id):
+        return random.Random('{}:{}:{}'.format(self.seed, kind, first_id))
+
+    def _first_id(self, model):
+        return (db.session.query(func.max(model.id)).scalar() or 0) + 1
+
+    def _genres(self, rng):
+        genres = set()
+        for _ in range(rng.choice((1, 1, 2, 2, 3))):
+            genres.add(self.genre(rng))
+        return sorted(genres)
+
+    def _entity(self, rng, row_id, name):
+        slug = name.lower().replace(' ', '')
+        return {
+            'id': row_id,
+            'name': name,
+            'name_key': name_key(name),
+            'city': self.city(rng),
+            'state': self.state(rng),
+            'phone': '{}-{}-{}'.format(rng.randint(200, 999),
+                                       rng.randint(200, 999),
+                                       rng.randint(1000, 9999)),
+            'genres': self._genres(rng),
+            'facebook_link': 'https://www.facebook.com/' + slug,
+            'website_link': 'https://www.{}.com'.format(slug),
+            'image_link': 'https://picsum.photos/seed/{}/300/300'.format(slug),
+        }
+
+    def venues(self, count):
+        first = self._first_id(Venue)
+        rng = self._rng('venues', first)
+
+        def rows():
+            for row_id in range(first, first + count):
+                row = self._entity(rng, row_id, 'The {} {} {}'.format(
+                    rng.choice(ADJECTIVES), rng.choice(NOUNS), row_id))
+                row['address'] = '{} {} Street'.format(
+                    rng.randint(1, 9999), rng.choice(CITIES))
+                row['seeking_talent'] = rng.random() < 0.3
+                yield row
+        self._write(Venue.__table__, rows(), 'venues')
+
+    def artists(self, count):
+        first = self._first_id(Artist)
+        rng = self._rng('artists', first)
+
+        def rows():
+            for row_id in range(first, first + count):
+                row = self._entity(rng, row_id, 'The {} {} {}'.format(
+                    rng.choice(ADJECTIVES), rng.choice(BAND_NOUNS), row_id))
+                row['seeking_venue'] = rng.random() < 0.3
+                yield row
+        self._write(Artist.__table__, rows(), 'artists')
+
+    def shows(self, count):
+        first = self._first_id(Show)
+        rng = self._rng('shows', first)
+        venue_ids = [row_id for row_id, in db.session.query(Venue.id).order_by(Venue.id)]
+        artist_ids = [row_id for row_id, in db.session.query(Artist.id).order_by(Artist.id)]
+        if not venue_ids or not artist_ids:
+            raise ValueError('shows need venues and artists to play at and in')
+        venue = _popularity(rng, venue_ids)
+        artist = _popularity(rng, artist_ids)
+        #each venue books its next show after its last one, from
+        #self.start for venues without shows
+        start = self.start
+        booked = dict(db.session.query(Show.venue_id, func.max(Show.end_time))
+                      .group_by(Show.venue_id))
+        now = datetime.now()
+
+        def rows():
+            for row_id in range(first, first + count):
+                venue_id = venue(rng)
+                start_time = (booked.get(venue_id) or start) + timedelta(
+                    hours=rng.randint(1, 72))
+                end_time = start_time + timedelta(minutes=rng.choice(SHOW_LENGTHS))
+                booked[venue_id] = end_time
+                yield {
+                    'id': row_id,
+                    'venue_id': venue_id,
+                    'artist_id': artist(rng),
+                    'start_time': start_time,
+                    'end_time': end_time,
+                    'is_upcoming': start_time > now,
+                }
+        self._write(Show.__table__, rows(), 'shows', counted=True)
+
+    def _write(self, table, rows, kind, counted=False):
+        started = time.monotonic()
+        written = 0
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            if self.postgres:
+                copy_rows(table, list(batch[0]), batch)
+            else:
+                db.session.execute(table.insert(), batch)
+            if counted:
+                count_shows(batch)
+            db.session.commit()
+            written += len(batch)
+            self.echo('{}: {} rows'.format(kind, written))
+        if self.postgres and written:
+            #ids were given explicitly, move the sequence past them
+            db.session.execute(text(
+                "SELECT setval(pg_get_serial_sequence(:table, 'id'), "
+                "(SELECT max(id) FROM {}))".format(table.name)),
+                {'table': table.name})
+            db.session.commit()
+        self.echo('{}: {} rows in {:.1f}s'.format(
+            kind, written, time.monotonic() - started))
+
+
+def generate(venues=0, artists=0, shows=0, seed=0, batch_size=10000, echo=None,
+             start=START):
+    generator = Generator(seed, batch_size, echo, start)
+    if venues:
+        generator.venues(venues)
+    if artists:
+        generator.artists(artists)
+    if shows:
+        generator.shows(shows)
+    #the rows bypassed the session, rebuild the sqlite search index
+    search.reset()
@@ -0,0 +1,85 @@
+import os
+import tempfile
+import threading
+import time
+from jinja2 import FileSystemBytecodeCache
+
+#jinja bytecode cache and template warm-up.
+#
+#Compiled templates are kept as bytecode in TEMPLATE_CACHE_DIR, which
+#every worker (and every deploy, as long as the templates don't
+#change, jinja checks the source checksum) shares. warm_templates()
+#loads every template under templates/ once at startup, so the first
+#requests a fresh worker serves don't pay for compiling
+#layouts/main.html and friends, and logs how long that took and how
+#much of it came from the cache.
+
+
+class SharedBytecodeCache(FileSystemBytecodeCache):
+    def __init__(self, directory):
+        super().__init__(directory, '%s.cache')
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def load_bytecode(self, bucket):
+        super().load_bytecode(bucket)
+        with self.lock:
+            if bucket.code is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+    def dump_bytecode(self, bucket):
+        #write and rename, so another worker never reads half a file
+        fd, path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                bucket.write_bytecode(f)
+            os.replace(path, self._get_cache_filename(bucket))
+        except OSError:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+
+def init_templates(app):
+    directory = app.config['TEMPLATE_CACHE_DIR']
+    if not directory:
+        return
+    directory = os.path.join(app.root_path, directory)
+    os.makedirs(directory, exist_ok=True)
+    app.jinja_env.bytecode_cache = SharedBytecodeCache(directory)
+
+
+def warm_templates(app):
+    #compile (or load from the bytecode cache) every template, after
+    #the filters they use are registered
+    if not app.config['TEMPLATE_WARMUP']:
+        return None
+    env = app.jinja_env
+    started = time.perf_counter()
+    names = env.list_templates(extensions=('html',))
+    failed = []
+    for name in names:
+        try:
+            env.get_template(name)
+        except Exception as e:
+            failed.append(name)
+            app.logger.warning('template %s does not compile: %s', name, e)
+    report = {
+        'templates': len(names),
+        'failed': failed,
+        'ms': round((time.perf_counter() - started) * 1000, 3),
+    }
+    if isinstance(env.bytecode_cache, SharedBytecodeCache):
+        report.update(env.bytecode_cache.stats())
+    app.extensions['template_warmup'] = report
+    app.logger.info(
+        'warmed up %d templates in %.1fms (%s from the bytecode cache)',
+        report['templates'], report['ms'], report.get('hits', 'none'))
+    return report
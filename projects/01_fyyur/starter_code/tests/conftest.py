@@ -0,0 +1,74 @@
+import os
+import sys
+
+import pytest
+
+#the app reads its settings from the environment when it is imported:
+#an in-memory sqlite database, no shared bytecode cache or slow query
+#log file, the admin endpoints on
+os.environ['DATABASE_URL'] = 'sqlite://'
+os.environ['FYYUR_TEMPLATE_CACHE_DIR'] = ''
+os.environ['FYYUR_SQL_SLOW_QUERY_LOG'] = ''
+os.environ['FYYUR_ADMIN_TOKEN'] = 'admin-token'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app as fyyur_app
+from cache import page_cache, value_cache, fragment_cache
+from models import db, Venue, Artist
+import search
+
+
+@pytest.fixture
+def app():
+    #no app context is left pushed: a request would reuse it, and with
+    #it the session and the recorded queries of the test
+    fyyur_app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with fyyur_app.app_context():
+        db.create_all()
+    yield fyyur_app
+    with fyyur_app.app_context():
+        db.drop_all()
+    for cache in (page_cache, value_cache, fragment_cache):
+        cache.clear()
+    search.reset()
+
+
+@pytest.fixture
+def context(app):
+    #for tests that use the database directly, not through requests
+    with app.app_context():
+        yield
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def add(app, *rows):
+    with app.app_context():
+        db.session.add_all(rows)
+        db.session.commit()
+        ids = [row.id for row in rows]
+        db.session.remove()
+    return ids
+
+
+def venue(**values):
+    values.setdefault('name', 'The Musical Hop')
+    values.setdefault('city', 'San Francisco')
+    values.setdefault('state', 'CA')
+    values.setdefault('address', '1015 Folsom Street')
+    values.setdefault('genres', ['Jazz'])
+    values.setdefault('facebook_link', 'https://www.facebook.com/TheMusicalHop')
+    return Venue(**values)
+
+
+def artist(**values):
+    values.setdefault('name', 'Guns N Petals')
+    values.setdefault('city', 'San Francisco')
+    values.setdefault('state', 'CA')
+    values.setdefault('genres', ['Rock n Roll'])
+    values.setdefault('facebook_link', 'https://www.facebook.com/GunsNPetals')
+    return Artist(**values)
@@ -0,0 +1,17 @@
+from flask import Flask
+
+from admin import init_admin
+
+
+def test_token_required_in_debug_mode(app, client):
+    assert app.debug
+    assert client.get('/admin/cache').status_code == 404
+    assert client.get('/admin/cache', headers={'X-Admin-Token': 'wrong'}).status_code == 404
+    assert client.get('/admin/cache', headers={'X-Admin-Token': 'admin-token'}).status_code == 200
+
+
+def test_not_registered_without_a_token():
+    app = Flask(__name__)
+    app.config['ADMIN_TOKEN'] = None
+    init_admin(app)
+    assert 'admin' not in app.blueprints
@@ -0,0 +1,53 @@
+import pytest
+
+from conftest import add, venue
+from models import db, Venue
+
+
+@pytest.mark.parametrize('limit, count', [('-1', 1), ('0', 1), ('2', 2), ('1000', 5)])
+def test_limit_is_clamped(app, client, limit, count):
+    add(app, *[venue(name='Venue {}'.format(i)) for i in range(5)])
+    response = client.get('/api/v1/venues?limit=' + limit)
+    assert response.status_code == 200
+    assert len(response.get_json()['data']) == count
+
+
+def test_limit_must_be_a_number(client):
+    assert client.get('/api/v1/venues?limit=abc').status_code == 400
+
+
+def test_conditional_get(app, client):
+    add(app, venue(name='The Musical Hop'), venue(name='Park Square Live Music'))
+    first = client.get('/api/v1/venues/1')
+    etag, last_modified = first.headers['ETag'], first.headers['Last-Modified']
+    assert client.get('/api/v1/venues/1', headers={
+        'If-None-Match': etag}).status_code == 304
+    assert client.get('/api/v1/venues/1', headers={
+        'If-Modified-Since': last_modified}).status_code == 304
+
+    with app.app_context():
+        db.session.get(Venue, 1).phone = '123-123-1234'
+        db.session.commit()
+    edited = client.get('/api/v1/venues/1', headers={'If-None-Match': etag})
+    assert edited.status_code == 200
+    assert edited.get_json()['phone'] == '123-123-1234'
+
+
+def test_conditional_get_of_a_collection(app, client):
+    add(app, venue(name='The Musical Hop'), venue(name='Park Square Live Music'))
+    first = client.get('/api/v1/venues')
+    etag = first.headers['ETag']
+    assert 'Last-Modified' not in first.headers
+    assert client.get('/api/v1/venues', headers={
+        'If-None-Match': etag}).status_code == 304
+
+    #a deleted row makes no row newer, only the etag notices, so a
+    #date, even one after every change, never gets a 304
+    with app.app_context():
+        Venue.query.filter(Venue.id == 2).delete()
+        db.session.commit()
+    assert client.get('/api/v1/venues', headers={
+        'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'}).status_code == 200
+    deleted = client.get('/api/v1/venues', headers={'If-None-Match': etag})
+    assert deleted.status_code == 200
+    assert [row['id'] for row in deleted.get_json()['data']] == [1]
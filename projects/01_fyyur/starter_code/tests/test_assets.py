@@ -0,0 +1,71 @@
+import gzip
+import json
+import os
+import shutil
+
+import pytest
+from flask import Flask
+
+import assets
+
+STATIC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static')
+
+
+@pytest.fixture
+def site(tmp_path):
+    #the app's css and js in a static folder of their own, built there
+    for source in assets.SOURCES:
+        shutil.copytree(os.path.join(STATIC, source), str(tmp_path / source))
+    (tmp_path / 'css' / 'extra.css').write_text("a { background: url('../img/a.png') }")
+    app = Flask(__name__, static_folder=str(tmp_path), static_url_path='/static')
+    app.config['ASSETS_USE_DIST'] = True
+    assets.init_assets(app)
+    return app
+
+
+def test_build(site, tmp_path):
+    manifest, _ = assets.build(site)
+    built = manifest['site.css']
+    assert built.startswith('site.') and built.endswith('.css') and len(built) == len('site.') + 12 + 4
+    dist = tmp_path / 'dist'
+    data = (dist / built).read_bytes()
+    assert gzip.decompress((dist / (built + '.gz')).read_bytes()) == data
+    assert json.loads((dist / 'manifest.json').read_text()) == manifest
+    #relative urls still point at the same files from dist/
+    assert b"url('/static/img/a.png')" in (dist / manifest['css/extra.css']).read_bytes()
+    #the same sources build to the same names
+    assert assets.build(site)[0] == manifest
+
+    #an edited file gets a new name, --clean drops the old one
+    (tmp_path / 'css' / 'extra.css').write_text('a { color: red }')
+    rebuilt, removed = assets.build(site, clean=True)
+    assert rebuilt['css/extra.css'] != manifest['css/extra.css']
+    assert not (dist / manifest['css/extra.css']).exists()
+    assert removed == 1 and (dist / rebuilt['site.css']).exists()
+
+
+def test_serving(site):
+    manifest, _ = assets.build(site)
+    client = site.test_client()
+    url = '/assets/' + manifest['site.css']
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Content-Type'].startswith('text/css')
+    assert 'immutable' in response.headers['Cache-Control']
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    plain = client.get(url, headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in plain.headers
+    assert gzip.decompress(response.data) == plain.data
+
+
+def test_urls(site):
+    with site.test_request_context():
+        #before a build, the plain files
+        assert assets.asset_url('js/script.js') == '/static/js/script.js'
+        assert assets.asset_urls('site.css') == [
+            '/static/' + name for name in assets.BUNDLES['site.css']]
+        manifest, _ = assets.build(site)
+        assert assets.asset_url('js/script.js') == '/assets/' + manifest['js/script.js']
+        assert assets.asset_urls('site.css') == ['/assets/' + manifest['site.css']]
+        site.config['ASSETS_USE_DIST'] = False
+        assert assets.asset_url('js/script.js') == '/static/js/script.js'
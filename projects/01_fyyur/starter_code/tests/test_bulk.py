@@ -0,0 +1,43 @@
+import json
+from datetime import datetime
+
+import bulk
+from bulk import Importer, copy_data
+from conftest import venue, artist
+from models import db, Show
+
+
+def test_schedule_is_trimmed_between_batches(context, tmp_path, monkeypatch):
+    monkeypatch.setattr(bulk, 'SCHEDULE_SHOWS', 1)
+    db.session.add_all([venue(name='Venue {}'.format(i)) for i in range(3)] + [artist()])
+    db.session.commit()
+    path = tmp_path / 'shows.jsonl'
+    #venue 1 is forgotten after the first batches, its double booking
+    #in the last line is still found, in the database
+    rows = [(1, '2030-01-01 20:00:00'), (2, '2030-01-01 20:00:00'),
+            (3, '2030-01-01 20:00:00'), (2, '2030-01-02 20:00:00'),
+            (1, '2030-01-01 21:00:00')]
+    path.write_text(''.join(json.dumps({
+        'venue_id': venue_id, 'artist_id': 1, 'start_time': start_time}) + '\n'
+        for venue_id, start_time in rows))
+    importer = Importer(batch_size=2)
+    report = importer.import_file('shows', str(path))
+    assert [number for number, _ in report.rejected] == [5]
+    assert report.inserted == 4
+    assert Show.query.count() == 4
+    assert importer.schedule.size <= 2
+
+
+def test_copy_data_nulls():
+    #only None is an unquoted empty field, which COPY reads as NULL
+    columns = ['name', 'website_link', 'phone', 'genres', 'seeking_talent',
+               'upcoming_shows_count', 'end_time']
+    rows = [{'name': 'The "Hop", SF', 'website_link': None, 'phone': '',
+             'genres': ['Rock n Roll', 'R&B'], 'seeking_talent': False,
+             'upcoming_shows_count': 3, 'end_time': None},
+            {'name': 'Two\nlines', 'website_link': 'https://x.example', 'phone': None,
+             'genres': [], 'seeking_talent': None, 'upcoming_shows_count': None,
+             'end_time': datetime(2030, 1, 1, 22)}]
+    assert copy_data(columns, rows) == (
+        '"The ""Hop"", SF",,"","{""Rock n Roll"",""R&B""}","false","3",\n'
+        '"Two\nlines","https://x.example",,"{}",,,"2030-01-01 22:00:00"\n')
@@ -0,0 +1,56 @@
+from datetime import date, datetime
+
+import pytest
+
+from conftest import add, artist, venue
+from models import Show
+from queries import calendar_month
+
+#march 2035 starts on a thursday: its page runs from monday february
+#26 to sunday april 1
+STARTS = [datetime(2035, 2, 25, 20), datetime(2035, 2, 26, 0), datetime(2035, 3, 15, 20),
+          datetime(2035, 4, 1, 23), datetime(2035, 4, 2, 0)]
+
+
+@pytest.fixture
+def shows(app):
+    add(app, venue(), venue(name='Park Square Live Music', city='New York', state='NY'),
+        artist())
+    add(app, *[Show(venue_id=1, artist_id=1, start_time=start) for start in STARTS],
+        Show(venue_id=2, artist_id=1, start_time=datetime(2035, 3, 15, 21)))
+
+
+def _days(weeks):
+    return {day['date']: [show.id for show in day['shows']]
+            for week in weeks for day in week if day['shows']}
+
+
+def test_month_range_and_filters(app, shows):
+    with app.app_context():
+        weeks, rows, truncated = calendar_month(2035, 3)
+        assert (weeks[0][0]['date'], weeks[-1][-1]['date']) == (date(2035, 2, 26), date(2035, 4, 1))
+        assert _days(weeks) == {date(2035, 2, 26): [2], date(2035, 3, 15): [3, 6],
+                                date(2035, 4, 1): [4]}
+        assert not truncated
+        assert [row.id for row in calendar_month(2035, 3, city='New York')[1]] == [6]
+        assert [row.id for row in calendar_month(2035, 3, venue_id=1)[1]] == [2, 3, 4]
+
+
+def test_month_is_truncated(app, client, shows, monkeypatch):
+    monkeypatch.setitem(app.config, 'CALENDAR_MAX_SHOWS', 2)
+    with app.app_context():
+        _, rows, truncated = calendar_month(2035, 3)
+    assert ([row.id for row in rows], truncated) == ([2, 3], True)
+    page = client.get('/calendar?month=2035-03').data
+    assert b'Not every show of this month fits' in page
+    #narrowed down by a filter, everything fits again
+    assert b'Not every show' not in client.get('/calendar?month=2035-03&city=New+York').data
+
+
+def test_api_range(client, shows):
+    response = client.get('/api/v1/calendar?start=2035-02-26&end=2035-04-02')
+    assert [row['id'] for row in response.get_json()['data']] == [2, 3, 6, 4]
+    response = client.get('/api/v1/calendar?start=2035-03-01&end=2035-04-01&artist_id=1&state=NY')
+    assert [row['id'] for row in response.get_json()['data']] == [6]
+    assert client.get('/api/v1/calendar?start=2035-01-01&end=2037-01-01').status_code == 400
+    assert client.get('/api/v1/calendar?start=2035-03-02&end=2035-03-01').status_code == 400
@@ -0,0 +1,46 @@
+from sqlalchemy.pool import NullPool
+
+from database import _statement_timeout, engine_options
+
+POSTGRES = 'postgresql://fyyur@localhost/fyyur'
+
+
+def _config(app, **values):
+    config = dict(app.config, SQLALCHEMY_DATABASE_URI=POSTGRES)
+    config.update(values)
+    return config
+
+
+def test_engine_options(app):
+    options = engine_options(_config(app, DB_POOL_SIZE=5, DB_MAX_OVERFLOW=3,
+                                     DB_STATEMENT_TIMEOUT=15000, DB_PGBOUNCER=False))
+    assert (options['pool_size'], options['max_overflow']) == (5, 3)
+    assert options['connect_args'] == {'options': '-c statement_timeout=15000'}
+    #behind pgbouncer connect options are rejected, SET LOCAL instead
+    assert 'connect_args' not in engine_options(_config(app, DB_PGBOUNCER=True))
+    assert engine_options(_config(app, DB_POOL_SIZE=0))['poolclass'] is NullPool
+    assert engine_options(app.config) == {}
+
+
+def test_statement_timeout_per_endpoint(app):
+    config = _config(app, DB_STATEMENT_TIMEOUT=15000, DB_PGBOUNCER=False)
+    #the connect option already is the default, no SET LOCAL
+    with app.test_request_context('/venues'):
+        assert _statement_timeout(config) is None
+    with app.test_request_context('/venues/search', method='POST'):
+        assert _statement_timeout(config) == 5000
+    #cli commands: no timeout, which the connection default isn't
+    with app.app_context():
+        assert _statement_timeout(config) == 0
+    config['DB_PGBOUNCER'] = True
+    with app.test_request_context('/venues'):
+        assert _statement_timeout(config) == 15000
+    with app.app_context():
+        assert _statement_timeout(config) is None
+
+
+def test_pool_stats(client):
+    stats = client.get('/admin/pool', headers={'X-Admin-Token': 'admin-token'}).get_json()
+    assert stats['pid'] > 0
+    assert stats['replicas'] == {}
+    assert 'status' in stats
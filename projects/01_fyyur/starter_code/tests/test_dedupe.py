@@ -0,0 +1,61 @@
+from conftest import add, venue
+from dedupe import clusters, find_duplicates, merge, name_key
+from models import db, Venue
+
+
+def test_name_key():
+    assert name_key('Musical Hop, The') == 'musical hop'
+    assert name_key('The Musical Hop') == 'musical hop'
+    assert name_key('Café Rock & Roll') == 'cafe rock and roll'
+
+
+def test_find_duplicates(context):
+    db.session.add_all([venue(name='The Musical Hop'), venue(name='Room 1'),
+                        venue(name='The Musical Hop', city='New York', state='NY')])
+    db.session.commit()
+    assert [row[:2] for row in find_duplicates(
+        Venue, 'Musical Hop, The', 'San Francisco', 'CA')] == [(1, 'The Musical Hop')]
+    assert find_duplicates(Venue, 'Musical Hop', 'Oakland', 'CA') == []
+    #the numbers have to match, however similar the rest is
+    assert find_duplicates(Venue, 'Room 2', 'San Francisco', 'CA') == []
+    assert len(find_duplicates(Venue, 'Room 1', 'San Francisco', 'CA')) == 1
+
+
+def test_explicit_zero_threshold(context):
+    db.session.add_all([venue(name='Blue Room'), venue(name='Blue Hall')])
+    db.session.commit()
+    assert clusters(Venue) == []
+    assert clusters(Venue, threshold=0) == [[1, 2]]
+
+
+def test_merge(context):
+    db.session.add_all([venue(name='The Musical Hop', phone=None),
+                        venue(name='Musical Hop, The', phone='123-123-1234',
+                              genres=['Folk'])])
+    db.session.commit()
+    assert clusters(Venue) == [[1, 2]]
+    assert merge(Venue, [1, 2]) == (1, [2], 0)
+    kept = Venue.query.one()
+    assert (kept.phone, kept.genres) == ('123-123-1234', ['Folk', 'Jazz'])
+
+
+def _form(**values):
+    form = {'name': 'The Musical Hop', 'city': 'San Francisco', 'state': 'CA',
+            'address': '1015 Folsom Street', 'genres': 'Jazz',
+            'facebook_link': 'https://www.facebook.com/TheMusicalHop'}
+    form.update(values)
+    return form
+
+
+def test_create_shows_duplicates_first(app, client):
+    add(app, venue())
+    response = client.post('/venues/create', data=_form(name='Musical Hop, The'))
+    assert b'/venues/1' in response.data
+    with app.app_context():
+        assert Venue.query.count() == 1
+
+    client.post('/venues/create', data=_form(name='Musical Hop, The', allow_duplicate='y'))
+    client.post('/venues/create', data=_form(name='The Blue Room'))
+    with app.app_context():
+        assert [row.name for row in Venue.query.order_by(Venue.id)] == [
+            'The Musical Hop', 'Musical Hop, The', 'The Blue Room']
@@ -0,0 +1,51 @@
+import pytest
+
+import export
+from bulk import Importer
+from conftest import venue, artist
+from models import db, Venue, Artist
+
+
+def _export(kind, format, path):
+    with open(path, 'w') as f:
+        for chunk in export.export(kind, format):
+            f.write(chunk)
+
+
+@pytest.mark.parametrize('format', export.FORMATS)
+def test_round_trip(context, tmp_path, format):
+    #every column filled in, the forms turn a missing one into ''
+    filled = {'phone': '123-123-1234', 'image_link': 'https://example.com/a.jpg',
+              'website_link': 'https://example.com', 'seeking_description': 'yes'}
+    for i in range(6):
+        db.session.add(venue(name='Venue {}'.format(i), seeking_talent=i % 3 == 0,
+                             genres=['Jazz', 'Folk'], **filled))
+        db.session.add(artist(name='Artist {}'.format(i), seeking_venue=i % 2 == 0,
+                              **filled))
+    db.session.commit()
+    before = {model: db.session.query(*columns).order_by(columns[0]).all()
+              for model, columns in ((Venue, export.COLUMNS['venues'][1:-1]),
+                                     (Artist, export.COLUMNS['artists'][1:-1]))}
+    paths = {kind: str(tmp_path / '{}.{}'.format(kind, format))
+             for kind in ('venues', 'artists')}
+    for kind, path in paths.items():
+        _export(kind, format, path)
+    Venue.query.delete()
+    Artist.query.delete()
+    db.session.commit()
+
+    importer = Importer()
+    for kind, path in paths.items():
+        report = importer.import_file(kind, path)
+        assert report.rejected == []
+        assert report.inserted == 6
+    for model, columns in ((Venue, export.COLUMNS['venues'][1:-1]),
+                           (Artist, export.COLUMNS['artists'][1:-1])):
+        assert db.session.query(*columns).order_by(columns[0]).all() == before[model]
+
+
+def test_csv_booleans(context):
+    db.session.add(venue(seeking_talent=False))
+    db.session.commit()
+    lines = ''.join(export.export('venues', 'csv')).splitlines()
+    assert lines[1].split(',')[10] == 'false'
@@ -0,0 +1,26 @@
+from datetime import datetime
+
+import babel.dates
+import dateutil.parser
+import pytest
+
+from app import format_datetime
+
+PATTERNS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+def _unmemoized(value, format):
+    #the filter as it was: parse, then babel with the pattern or name
+    return babel.dates.format_datetime(
+        dateutil.parser.parse(value), PATTERNS.get(format, format), locale='en')
+
+
+@pytest.mark.parametrize('format', ['full', 'medium', 'long', 'short', 'y-MM-dd HH:mm'])
+def test_datetime_filter_output(format):
+    value = datetime(2035, 4, 1, 20, 0)
+    expected = _unmemoized(str(value), format)
+    assert format_datetime(value, format) == expected
+    assert format_datetime(str(value), format) == expected
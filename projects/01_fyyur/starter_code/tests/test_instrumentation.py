@@ -0,0 +1,52 @@
+import json
+import logging
+
+from conftest import add, venue
+
+ADMIN = {'X-Admin-Token': 'admin-token'}
+
+
+def _records(caplog):
+    return [json.loads(record.getMessage()) for record in caplog.records
+            if record.name == 'fyyur.sql']
+
+
+def test_request_headers(app, client):
+    add(app, venue())
+    response = client.get('/venues/1')
+    assert int(response.headers['X-SQL-Count']) >= 1
+    assert response.headers['X-SQL-Time'].endswith('ms')
+    assert 'SELECT' in response.headers['X-SQL-Slowest']
+
+
+def test_slow_query_log(app, client, caplog, monkeypatch):
+    add(app, venue(), venue(name='Park Square Live Music'))
+    client.get('/venues/1')
+    assert _records(caplog) == []
+
+    monkeypatch.setitem(app.config, 'SQL_SLOW_QUERY_MS', 0)
+    monkeypatch.setitem(app.config, 'SQL_SLOW_REQUEST_MS', 0)
+    with caplog.at_level(logging.WARNING, logger='fyyur.sql'):
+        response = client.get('/venues/2')
+    records = _records(caplog)
+    queries = [record for record in records if record['event'] == 'slow_query']
+    assert len(queries) == int(response.headers['X-SQL-Count'])
+    assert queries[0]['endpoint'] == 'show_venue'
+    #without its parameters
+    assert queries[0]['statement'].endswith('WHERE venue.id = ?')
+    [slow_request] = [record for record in records if record['event'] == 'slow_request']
+    assert slow_request['path'] == '/venues/2'
+    assert slow_request['statements'] == len(queries)
+
+
+def test_route_totals(app, client):
+    add(app, venue())
+    client.delete('/admin/sql', headers=ADMIN)
+    for _ in range(3):
+        client.get('/venues/1')
+    stats = client.get('/admin/sql', headers=ADMIN).get_json()
+    assert stats['show_venue']['requests'] == 3
+    assert stats['show_venue']['statements_max'] >= 1
+    assert stats['show_venue']['slowest']['statement'].startswith('SELECT')
+    client.delete('/admin/sql', headers=ADMIN)
+    assert 'show_venue' not in client.get('/admin/sql', headers=ADMIN).get_json()
@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import counters
+from conftest import add, artist, venue
+from models import db, Show, Venue
+from queries import QueryBudgetExceeded, query_budget
+
+
+def _catalogue(app, size):
+    add(app, *[venue(name='Venue {}'.format(i)) for i in range(size)],
+        *[artist(name='Artist {}'.format(i)) for i in range(size)])
+    start = datetime.now() + timedelta(days=1)
+    add(app, *[Show(venue_id=i % size + 1, artist_id=i % size + 1,
+                    start_time=start + timedelta(days=i),
+                    end_time=start + timedelta(days=i, hours=2))
+               for i in range(size * 3)])
+
+
+def _statements(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.headers['X-Cache'] == 'MISS'
+    return int(response.headers['X-SQL-Count'])
+
+
+@pytest.mark.parametrize('url, budget', [
+    ('/shows', 1), ('/venues', 2), ('/artists', 2),
+    ('/venues/1', 2), ('/artists/1', 2),
+])
+@pytest.mark.parametrize('size', [2, 30])
+def test_statements_per_page(app, client, url, budget, size):
+    #the same few statements however many rows there are
+    _catalogue(app, size)
+    assert _statements(client, url) <= budget
+
+
+def test_counters_roll_over(app, client):
+    #the upcoming / past counters the pages read instead of the shows
+    _catalogue(app, 2)
+    with app.app_context():
+        assert [row.upcoming_shows_count for row in Venue.query.order_by(Venue.id)] == [3, 3]
+        #shows 1 and 2 (one of each venue) have started by then
+        counters.roll_over(now=datetime.now() + timedelta(days=2, hours=12))
+        db.session.commit()
+        assert [(row.upcoming_shows_count, row.past_shows_count)
+                for row in Venue.query.order_by(Venue.id)] == [(2, 1), (2, 1)]
+
+
+def test_query_budget_raises_in_debug_mode(app):
+    @query_budget(1)
+    def view():
+        db.session.query(Venue.id).all()
+        db.session.query(Venue.id).all()
+        return 'ok'
+
+    with app.test_request_context():
+        with pytest.raises(QueryBudgetExceeded):
+            view()
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import artist, venue
+from models import db, Show
+from pagination import encode_cursor
+from queries import show_listing
+
+
+@pytest.mark.parametrize('cursor', [
+    encode_cursor([1]),
+    encode_cursor([1, 2, 3]),
+    encode_cursor(['tomorrow', 1]),
+    encode_cursor([None, 1]),
+    encode_cursor({'dt': 1}),
+    'not a cursor',
+])
+def test_bad_cursor_is_400(client, cursor):
+    assert client.get('/shows?after=' + cursor).status_code == 400
+    assert client.get('/shows?before=' + cursor).status_code == 400
+
+
+def _walk(app, **cursor):
+    #every page from the cursor on, in the direction it points
+    pages = []
+    while True:
+        page = show_listing(**cursor)
+        pages.append([show['id'] for show in page.items])
+        if 'before' in cursor:
+            if not page.has_prev:
+                return pages[::-1]
+            cursor = {'before': page.prev_cursor}
+        else:
+            if not page.has_next:
+                return pages
+            cursor = {'after': page.next_cursor}
+
+
+def test_paging_is_stable(app, context, monkeypatch):
+    monkeypatch.setitem(app.config, 'PAGE_SIZE', 3)
+    db.session.add_all([venue(), artist()])
+    db.session.commit()
+    start = datetime(2030, 1, 1, 20)
+    #pairs of shows at the same time, the id breaks the tie
+    db.session.add_all([Show(venue_id=1, artist_id=1, start_time=start + timedelta(days=i // 2))
+                        for i in range(10)])
+    db.session.commit()
+    expected = [row.id for row in Show.query.order_by(Show.start_time, Show.id)]
+
+    forward = _walk(app)
+    assert [len(page) for page in forward] == [3, 3, 3, 1]
+    assert sum(forward, []) == expected
+    #walking back from past the end gives the same rows
+    back = _walk(app, before=encode_cursor([datetime(2031, 1, 1), 0]))
+    assert sum(back, []) == expected
+
+    #a show added before the current page doesn't shift the next one
+    first = show_listing()
+    db.session.add(Show(venue_id=1, artist_id=1, start_time=start - timedelta(days=1)))
+    db.session.commit()
+    second = show_listing(after=first.next_cursor)
+    assert [show['id'] for show in second.items] == expected[3:6]
@@ -0,0 +1,40 @@
+import pytest
+
+from conftest import add, venue
+
+ADMIN = {'X-Admin-Token': 'admin-token'}
+
+
+@pytest.fixture
+def profiles(app, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'PROFILE_DIR', str(tmp_path))
+    monkeypatch.setitem(app.config, 'PROFILE_MAX_FILES', 2)
+    return tmp_path
+
+
+def test_only_signed_requests_are_profiled(app, client, profiles):
+    add(app, venue())
+    assert 'X-Profile-Id' not in client.get('/venues/1').headers
+    assert 'X-Profile-Id' not in client.get(
+        '/venues/1', headers={'X-Profile': 'profile.forged.token'}).headers
+    assert list(profiles.iterdir()) == []
+
+    token = client.get('/admin/profiles/token', headers=ADMIN).get_json()['token']
+    response = client.get('/artists', headers={'X-Profile': token})
+    profile_id = response.headers['X-Profile-Id']
+    summary = client.get('/admin/profiles/{}.json'.format(profile_id), headers=ADMIN).get_json()
+    assert (summary['endpoint'], summary['status']) == ('artists', 200)
+    #the request's time split into database, templates and python
+    assert summary['db_ms'] > 0 and summary['template_ms'] > 0
+    assert summary['total_ms'] >= summary['db_ms'] + summary['template_ms']
+    prof = client.get('/admin/profiles/{}.prof'.format(profile_id), headers=ADMIN)
+    assert prof.status_code == 200 and prof.data
+
+
+def test_profiles_are_a_ring(app, client, profiles, monkeypatch):
+    monkeypatch.setitem(app.config, 'PROFILE_SAMPLE_RATE', 1.0)
+    ids = [client.get('/').headers['X-Profile-Id'] for _ in range(3)]
+    listed = client.get('/admin/profiles', headers=ADMIN).get_json()
+    assert len(listed) == 2 and {summary['id'] for summary in listed} <= set(ids)
+    assert len(list(profiles.glob('*.prof'))) == 2
+    assert client.get('/admin/profiles/../x.json', headers=ADMIN).status_code == 404
@@ -0,0 +1,20 @@
+import pytest
+
+from conftest import venue
+from models import db, Venue
+from queries import has_genre
+
+
+@pytest.mark.parametrize('genres, genre, found', [
+    (['Jazz'], 'Jazz', True),
+    (['Jazz'], 'Ja%', False),
+    (['Jazz'], 'J_zz', False),
+    (['Rock "n" Roll'], 'Rock "n" Roll', True),
+    (['50%_off'], '50%_off', True),
+    (['back\\slash'], 'back\\slash', True),
+    (['Jazz', 'Folk'], 'Jazz", "Folk', False),
+])
+def test_has_genre_on_sqlite(context, genres, genre, found):
+    db.session.add(venue(genres=genres))
+    db.session.commit()
+    assert (Venue.query.filter(has_genre(Venue.genres, genre)).count() == 1) is found
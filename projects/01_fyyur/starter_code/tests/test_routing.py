@@ -0,0 +1,57 @@
+import time
+
+import pytest
+
+from conftest import add, venue
+from models import db
+
+
+@pytest.fixture
+def replica(app, tmp_path):
+    #a second sqlite file standing in for a replica that lags behind
+    app.config.update(
+        SQLALCHEMY_BINDS={'replica0': 'sqlite:///' + str(tmp_path / 'replica.db')},
+        REPLICA_BINDS=['replica0'])
+    with app.app_context():
+        engine = db.get_engine(app, bind='replica0')
+    db.Model.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+    app.config.update(SQLALCHEMY_BINDS={}, REPLICA_BINDS=[])
+
+
+def _lagging(app, replica):
+    add(app, venue(name='Fresh Hop'))
+    with replica.begin() as connection:
+        connection.execute(db.Model.metadata.tables['venue'].insert(), {
+            'id': 1, 'name': 'Stale Hop', 'city': 'San Francisco', 'state': 'CA',
+            'genres': ['Jazz'], 'address': '1015 Folsom Street'})
+
+
+def test_reads_go_to_the_replica(app, client, replica):
+    _lagging(app, replica)
+    assert b'Stale Hop' in client.get('/venues/1').data
+
+
+def test_a_write_sticks_to_the_primary(app, client, replica):
+    _lagging(app, replica)
+    response = client.post('/venues/1/edit', data={
+        'name': 'Fresh Hop', 'city': 'San Francisco', 'state': 'CA',
+        'address': '1015 Folsom Street', 'genres': 'Jazz',
+        'facebook_link': 'https://www.facebook.com/TheMusicalHop'})
+    assert response.status_code == 302
+    with client.session_transaction() as session:
+        assert session['primary_until'] > time.time()
+    assert b'Fresh Hop' in client.get('/venues/1').data
+
+
+def test_sticky_client_skips_the_page_cache(app, client, replica):
+    _lagging(app, replica)
+    #another client fills the cache from the replica
+    assert client.get('/venues/1').headers['X-Cache'] == 'MISS'
+    assert client.get('/venues/1').headers['X-Cache'] == 'HIT'
+    with client.session_transaction() as session:
+        session['primary_until'] = time.time() + 10
+    response = client.get('/venues/1')
+    assert 'X-Cache' not in response.headers
+    assert b'Fresh Hop' in response.data
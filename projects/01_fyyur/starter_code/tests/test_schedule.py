@@ -0,0 +1,48 @@
+import random
+
+from conftest import add, artist, venue
+from models import Show
+from schedule import IntervalTree
+
+
+def test_interval_tree_matches_a_scan():
+    rng = random.Random(0)
+    intervals = []
+    tree = IntervalTree()
+    for _ in range(500):
+        start = rng.randrange(10000)
+        end = start + rng.randrange(1, 50)
+        query = rng.randrange(10000)
+        query_end = query + rng.randrange(1, 50)
+        assert tree.overlaps(query, query_end) == any(
+            s < query_end and e > query for s, e in intervals)
+        tree.add(start, end)
+        intervals.append((start, end))
+    assert len(tree) == 500
+    #built in one go from the same intervals
+    built = IntervalTree(intervals)
+    assert all(built.overlaps(s, e) for s, e in intervals)
+    #balanced: height within the AVL bound
+    assert tree.root.height <= 13
+
+
+def _show(client, start, end, venue_id=1):
+    return client.post('/shows/create', data={
+        'artist_id': '1', 'venue_id': str(venue_id),
+        'start_time': start, 'end_time': end})
+
+
+def test_create_show_rejects_double_booking(app, client):
+    add(app, venue(), venue(name='Park Square Live Music'), artist())
+    assert b'successfully listed' in _show(
+        client, '2035-04-01 20:00:00', '2035-04-01 22:00:00').data
+    response = _show(client, '2035-04-01 21:00:00', '2035-04-01 23:00:00')
+    assert b'already booked from 2035-04-01 20:00 to 2035-04-01 22:00' in response.data
+    #back to back, and the same time at another venue, are fine
+    assert b'successfully listed' in _show(
+        client, '2035-04-01 22:00:00', '2035-04-01 23:00:00').data
+    assert b'successfully listed' in _show(
+        client, '2035-04-01 21:00:00', '2035-04-01 23:00:00', venue_id=2).data
+    with app.app_context():
+        assert [(row.venue_id, row.start_time.hour) for row in
+                Show.query.order_by(Show.id)] == [(1, 20), (1, 22), (2, 21)]
@@ -0,0 +1,51 @@
+from conftest import venue
+from models import db, Venue
+from search import ranked_search
+
+
+def test_only_the_last_word_is_a_prefix(context):
+    db.session.add_all([venue(name='The Musical Hop'), venue(name='Musicality Hopscotch')])
+    db.session.commit()
+    assert [row['name'] for row in ranked_search(Venue, 'musical ho')] == [
+        'The Musical Hop']
+    assert len(ranked_search(Venue, 'musical')) == 2
+    assert ranked_search(Venue, 'musi hop') == []
+
+
+def _names(term):
+    return [row['name'] for row in ranked_search(Venue, term)]
+
+
+def test_index_follows_the_session(context):
+    db.session.add(venue(name='The Musical Hop'))
+    db.session.commit()
+    #builds the index
+    assert _names('musical') == ['The Musical Hop']
+
+    db.session.add(venue(name='Park Square Live Music'))
+    db.session.commit()
+    assert _names('park') == ['Park Square Live Music']
+
+    hop = db.session.get(Venue, 1)
+    hop.name = 'The Dueling Pianos Bar'
+    db.session.commit()
+    assert _names('musical') == []
+    assert _names('pianos') == ['The Dueling Pianos Bar']
+
+    #deleting a venue makes the flush look at its shows (none here),
+    #they are loaded up front, a lazy load would raise in tests
+    hop = Venue.query.options(db.selectinload(Venue.shows)).filter_by(id=1).one()
+    db.session.delete(hop)
+    db.session.commit()
+    assert _names('pianos') == []
+
+    #flushed, then rolled back: never in the index
+    db.session.add(venue(name='The Blue Room'))
+    db.session.flush()
+    db.session.rollback()
+    assert _names('blue') == []
+
+    #a bulk delete drops the index, it is rebuilt from the table
+    Venue.query.filter(Venue.id == 2).delete()
+    db.session.commit()
+    assert _names('park') == []
@@ -0,0 +1,17 @@
+from models import db, Show, Venue
+import synthetic
+
+
+def _generate():
+    db.drop_all()
+    db.create_all()
+    synthetic.generate(venues=5, artists=5, shows=50, seed=3)
+    return (db.session.query(Venue.id, Venue.name, Venue.city, Venue.genres).all(),
+            db.session.query(Show.id, Show.venue_id, Show.artist_id,
+                             Show.start_time, Show.end_time).order_by(Show.id).all())
+
+
+def test_same_seed_same_rows(context):
+    first = _generate()
+    assert first == _generate()
+    assert min(show.start_time for show in first[1]) > synthetic.START
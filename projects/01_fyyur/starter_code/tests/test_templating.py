@@ -0,0 +1,32 @@
+from jinja2.utils import LRUCache
+
+from templating import SharedBytecodeCache, warm_templates
+
+
+def _fresh_worker(app, monkeypatch, directory):
+    #a new worker: nothing compiled in memory, the shared cache on disk
+    monkeypatch.setattr(app.jinja_env, 'cache', LRUCache(400))
+    monkeypatch.setattr(app.jinja_env, 'bytecode_cache', SharedBytecodeCache(str(directory)))
+
+
+def test_warm_up_fills_the_shared_cache(app, monkeypatch, tmp_path):
+    monkeypatch.setitem(app.config, 'TEMPLATE_WARMUP', True)
+    monkeypatch.setitem(app.extensions, 'template_warmup', None)
+    _fresh_worker(app, monkeypatch, tmp_path)
+    first = warm_templates(app)
+    assert first['failed'] == []
+    assert first['templates'] >= 10
+    assert (first['hits'], first['misses']) == (0, first['templates'])
+    assert len(list(tmp_path.glob('*.cache'))) == first['templates']
+    assert not list(tmp_path.glob('*.tmp'))
+
+    #the next worker loads everything from the cache
+    _fresh_worker(app, monkeypatch, tmp_path)
+    second = warm_templates(app)
+    assert (second['hits'], second['misses']) == (second['templates'], 0)
+    assert app.extensions['template_warmup'] == second
+
+
+def test_warm_up_can_be_turned_off(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'TEMPLATE_WARMUP', False)
+    assert warm_templates(app) is None
@@ -0,0 +1,100 @@
+import io
+import os
+import time
+
+import pytest
+from PIL import Image
+
+from thumbnails import (FetchError, FileFetcher, HTTPFetcher, Thumbnailer,
+                        ThumbnailStore, public_address, thumbnail_url)
+
+
+def _thumbnails(size):
+    return {'small': ('jpg', b'x' * size), 'large': ('jpg', b'x' * size)}
+
+
+def _use(store, url, when):
+    #what find() does, at a given time
+    for size in ('small', 'large'):
+        path = store.find(url, size)
+        os.utime(path, (when, os.stat(path).st_mtime))
+
+
+def test_store_evicts_least_recently_used(tmp_path):
+    store = ThumbnailStore(str(tmp_path), max_bytes=1000)
+    store.add('https://example.com/a.jpg', 'a' * 64, _thumbnails(200))
+    store.add('https://example.com/b.jpg', 'b' * 64, _thumbnails(200))
+    #the same picture behind another url is stored once
+    store.add('https://example.com/a-again.jpg', 'a' * 64, _thumbnails(200))
+    assert store.size == 800
+    _use(store, 'https://example.com/b.jpg', time.time() - 60)
+    _use(store, 'https://example.com/a.jpg', time.time())
+
+    #over the limit: b, used last a minute ago, goes, every size of it
+    #and its url
+    store.add('https://example.com/c.jpg', 'c' * 64, _thumbnails(200))
+    assert store.size == 800
+    assert store.find('https://example.com/b.jpg', 'small') is None
+    assert not os.path.exists(store._url_path('https://example.com/b.jpg'))
+    assert not os.path.exists(store._object_path('b' * 64, 'large', 'jpg'))
+    for url in ('a.jpg', 'a-again.jpg', 'c.jpg'):
+        assert store.find('https://example.com/' + url, 'large')
+
+
+@pytest.mark.parametrize('address', [
+    '127.0.0.1', '10.0.0.1', '192.168.1.1', '169.254.169.254', '0.0.0.0',
+    '224.0.0.1', '::1', 'fe80::1%eth0', '::ffff:127.0.0.1', 'fc00::1'])
+def test_private_addresses_are_refused(address):
+    assert not public_address(address)
+
+
+def test_public_addresses():
+    assert public_address('93.184.216.34')
+    assert public_address('2606:2800:220:1:248:1893:25c8:1946')
+
+
+@pytest.mark.parametrize('url', ['http://127.0.0.1:9/a.jpg', 'https://127.0.0.1:9/a.jpg',
+                                 'https://[::1]:9/a.jpg', 'file:///etc/passwd'])
+def test_fetcher_refuses_private_urls(url):
+    with pytest.raises(FetchError):
+        HTTPFetcher(timeout=1)(url)
+
+
+def test_thumbnail_url_follows_the_image_link(app):
+    with app.test_request_context():
+        url = thumbnail_url('venue', 1, 'https://example.com/hop.jpg', 'small')
+        assert url.startswith('/thumbnails/venue/1/small?v=')
+        assert thumbnail_url('venue', 1, 'https://example.com/hop.jpg', 'small') == url
+        assert thumbnail_url('venue', 1, 'https://example.com/hop2.jpg', 'small') != url
+
+
+def _wait(thumbnailer):
+    deadline = time.time() + 30
+    while thumbnailer.pending and time.time() < deadline:
+        time.sleep(0.01)
+    assert not thumbnailer.pending
+
+
+def test_thumbnail_is_made_in_the_background(tmp_path):
+    source = tmp_path / 'source' / 'example.com'
+    source.mkdir(parents=True)
+    out = io.BytesIO()
+    Image.new('RGB', (800, 600), 'red').save(out, 'JPEG')
+    (source / 'hop.jpg').write_bytes(out.getvalue())
+    thumbnailer = Thumbnailer(ThumbnailStore(str(tmp_path / 'store'), 10 ** 6),
+                              FileFetcher(str(tmp_path / 'source')), 1, 30)
+    try:
+        url = 'https://example.com/hop.jpg'
+        assert thumbnailer.get(url, 'small') is None
+        _wait(thumbnailer)
+        with Image.open(thumbnailer.get(url, 'small')) as image:
+            assert image.size == (160, 120)
+
+        #a missing original isn't tried again right away
+        assert thumbnailer.get('https://example.com/gone.jpg', 'small') is None
+        _wait(thumbnailer)
+        assert 'https://example.com/gone.jpg' in thumbnailer.failed
+        assert not thumbnailer.queue('https://example.com/gone.jpg')
+    finally:
+        thumbnailer.jobs.shutdown()
+        thumbnailer.pool.shutdown()
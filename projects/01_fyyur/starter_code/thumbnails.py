@@ -0,0 +1,407 @@
+import hashlib
+import http.client
+import io
+import ipaddress
+import logging
+import os
+import socket
+import ssl
+import threading
+import time
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import urlparse
+from flask import Blueprint, abort, current_app, redirect, send_file, url_for
+from PIL import Image
+from models import db, Venue, Artist
+
+#thumbnails of the venue and artist image_link artwork.
+#
+#Pages link /thumbnails/<kind>/<id>/<size>?v=<url hash> instead of
+#the full size original. The first request for an image redirects to
+#the original and queues it: a background thread of the worker fetches
+#it (HTTPFetcher, or FileFetcher reading a local mirror, or any
+#callable passed to init_thumbnails), resizes it into every SIZES in
+#a process pool and stores the results under the sha256 of the
+#original, so the same picture behind several urls is stored once:
+#
+#    THUMBNAIL_DIR/urls/<sha256 of the url>        -> sha256 of the original
+#    THUMBNAIL_DIR/objects/ab/<sha256>-<size>.jpg  (or .png with alpha)
+#
+#The store is bounded by THUMBNAIL_MAX_BYTES. A hit bumps the file's
+#atime and the originals least recently used are removed first, every
+#size of them and the urls pointing to them. The v parameter is a hash
+#of image_link, so thumbnails are cached for a year and only an edited
+#image_link gets a new url. Until its thumbnail exists, and for
+#RETRY_AGE after it couldn't be fetched or decoded, an image redirects
+#to the original.
+#
+#image_link is whatever was typed into a form, so HTTPFetcher only
+#connects to public addresses: the host is resolved and checked on
+#every connection it opens, redirects included, and the connection
+#goes to the address that was checked.
+
+SIZES = {'small': 160, 'medium': 320, 'large': 640}
+MODELS = {'venue': Venue, 'artist': Artist}
+MAX_AGE = 365 * 24 * 3600
+#what an image without a thumbnail is redirected with, and how long a
+#failed one isn't tried again
+RETRY_AGE = 300
+
+log = logging.getLogger('fyyur.thumbnails')
+
+
+class FetchError(Exception):
+    pass
+
+
+def public_address(address):
+    ip = ipaddress.ip_address(address.split('%')[0])
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+def _connect(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+    #socket.create_connection, refusing loopback, private, link local
+    #(169.254.169.254) and other addresses that aren't on the internet
+    host, port = address
+    try:
+        infos = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        raise FetchError('{}: {}'.format(host, e))
+    error = FetchError('{} has no public address'.format(host))
+    for family, type_, proto, _, sockaddr in infos:
+        if not public_address(sockaddr[0]):
+            error = FetchError('{} resolves to {}, not a public address'.format(
+                host, sockaddr[0]))
+            continue
+        sock = socket.socket(family, type_, proto)
+        try:
+            if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                sock.settimeout(timeout)
+            if source_address:
+                sock.bind(source_address)
+            sock.connect(sockaddr)
+            return sock
+        except OSError as e:
+            sock.close()
+            error = e
+    raise error
+
+
+class _HTTPConnection(http.client.HTTPConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _connect
+
+
+class _HTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _connect
+
+
+class _HTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, request):
+        return self.do_open(_HTTPConnection, request)
+
+
+class _HTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, request):
+        return self.do_open(_HTTPSConnection, request, context=self._context)
+
+
+class HTTPFetcher:
+    def __init__(self, timeout=10, max_bytes=20 * 1024 * 1024):
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        #only http(s), no proxies from the environment (the proxy would
+        #make the connection, unchecked), redirects go through the same
+        #handlers so every hop is checked
+        self.opener = urllib.request.OpenerDirector()
+        #create_default_context verifies the certificate and hostname
+        for handler in (_HTTPHandler(), _HTTPSHandler(context=ssl.create_default_context()),
+                        urllib.request.HTTPRedirectHandler(),
+                        urllib.request.HTTPDefaultErrorHandler(),
+                        urllib.request.HTTPErrorProcessor()):
+            self.opener.add_handler(handler)
+
+    def __call__(self, url):
+        if urlparse(url).scheme not in ('http', 'https'):
+            raise FetchError('not an http url: {}'.format(url))
+        request = urllib.request.Request(url, headers={'User-Agent': 'fyyur-thumbnails'})
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                data = response.read(self.max_bytes + 1)
+        except FetchError:
+            raise
+        except (OSError, ValueError, http.client.HTTPException) as e:
+            raise FetchError('{}: {}'.format(url, e))
+        if len(data) > self.max_bytes:
+            raise FetchError('{} is larger than {} bytes'.format(url, self.max_bytes))
+        return data
+
+
+class FileFetcher:
+    #originals from a local directory laid out like the urls,
+    #https://example.com/a/b.jpg is <directory>/example.com/a/b.jpg.
+    #For tests and offline development.
+    def __init__(self, directory):
+        self.directory = os.path.abspath(directory)
+
+    def __call__(self, url):
+        parsed = urlparse(url)
+        path = os.path.abspath(os.path.join(
+            self.directory, parsed.netloc, parsed.path.lstrip('/')))
+        if not path.startswith(self.directory + os.sep):
+            raise FetchError('{} is outside of {}'.format(url, self.directory))
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError as e:
+            raise FetchError('{}: {}'.format(url, e))
+
+
+def resize(data, sizes):
+    #runs in the process pool: every size of one original, decoded
+    #once. Returns {size: (extension, bytes)}.
+    image = Image.open(io.BytesIO(data))
+    largest = max(sizes.values())
+    #jpeg can decode straight at a fraction of the full size
+    image.draft('RGB', (largest, largest))
+    alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+    image = image.convert('RGBA' if alpha else 'RGB')
+    thumbnails = {}
+    for size, edge in sizes.items():
+        thumbnail = image.copy()
+        thumbnail.thumbnail((edge, edge), Image.LANCZOS)
+        out = io.BytesIO()
+        if alpha:
+            thumbnail.save(out, 'PNG', optimize=True)
+            thumbnails[size] = ('png', out.getvalue())
+        else:
+            thumbnail.save(out, 'JPEG', quality=85, optimize=True, progressive=True)
+            thumbnails[size] = ('jpg', out.getvalue())
+    return thumbnails
+
+
+class ThumbnailStore:
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        #bytes stored, counted on the first write and kept up to date
+        #by this process, recounted whenever the store is trimmed
+        self.size = None
+
+    def _url_path(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, 'urls', key[:2], key)
+
+    def _object_path(self, digest, size, extension):
+        return os.path.join(self.directory, 'objects', digest[:2],
+                            '{}-{}.{}'.format(digest, size, extension))
+
+    def find(self, url, size):
+        try:
+            with open(self._url_path(url)) as f:
+                digest = f.read().strip()
+        except FileNotFoundError:
+            return None
+        for extension in ('jpg', 'png'):
+            path = self._object_path(digest, size, extension)
+            try:
+                #the atime is the last use, for the lru. The mtime
+                #stays, send_file's ETag and Last-Modified are made of it.
+                os.utime(path, (time.time(), os.stat(path).st_mtime))
+                return path
+            except FileNotFoundError:
+                continue
+        return None
+
+    def add(self, url, digest, thumbnails):
+        written = 0
+        for size, (extension, data) in thumbnails.items():
+            written += _write(self._object_path(digest, size, extension), data)
+        _write(self._url_path(url), digest.encode())
+        with self.lock:
+            if self.size is None:
+                self.size = self._count()
+            else:
+                self.size += written
+            if self.size > self.max_bytes:
+                self._trim()
+
+    def _objects(self):
+        for root, _, files in os.walk(os.path.join(self.directory, 'objects')):
+            for filename in files:
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield stat.st_atime, stat.st_size, path
+
+    def _count(self):
+        return sum(size for _, size, _ in self._objects())
+
+    def _trim(self):
+        #down to 90% so the next few writes don't trim again. An
+        #original goes as a whole, all of its sizes, last used when
+        #any of them was
+        originals = {}
+        for atime, size, path in self._objects():
+            digest = os.path.basename(path).split('-')[0]
+            used, total, paths = originals.get(digest, (0, 0, []))
+            originals[digest] = (max(used, atime), total + size, paths + [path])
+        self.size = sum(total for _, total, _ in originals.values())
+        target = self.max_bytes * 0.9
+        removed = set()
+        for used, total, paths in sorted(originals.values()):
+            if self.size <= target:
+                break
+            for path in paths:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    #trimmed by another worker
+                    pass
+            removed.add(os.path.basename(paths[0]).split('-')[0])
+            self.size -= total
+        if removed:
+            self._forget(removed)
+
+    def _forget(self, digests):
+        #the urls of removed originals, so urls/ doesn't grow forever
+        for root, _, files in os.walk(os.path.join(self.directory, 'urls')):
+            for filename in files:
+                path = os.path.join(root, filename)
+                try:
+                    with open(path) as f:
+                        if f.read().strip() in digests:
+                            os.remove(path)
+                except FileNotFoundError:
+                    continue
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = '{}.{}.{}.tmp'.format(path, os.getpid(), threading.get_ident())
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return len(data)
+
+
+class Thumbnailer:
+    def __init__(self, store, fetcher, workers, timeout):
+        self.store = store
+        self.fetcher = fetcher
+        self.workers = workers
+        self.timeout = timeout
+        self.pool = None
+        self.jobs = None
+        self.pool_pid = None
+        self.lock = threading.Lock()
+        #urls queued or being made, so one url is only fetched once at
+        #a time, and url -> when it last failed
+        self.pending = set()
+        self.failed = {}
+
+    def _pools(self):
+        #one pool of fetching threads and one of resizing processes per
+        #worker process, started on first use (after the server forked)
+        with self.lock:
+            if self.pool is None or self.pool_pid != os.getpid():
+                self.pool = ProcessPoolExecutor(max_workers=self.workers)
+                self.jobs = ThreadPoolExecutor(max_workers=self.workers)
+                self.pool_pid = os.getpid()
+                self.pending.clear()
+            return self.jobs, self.pool
+
+    def get(self, url, size):
+        #path of the thumbnail, or None when there is none yet, it is
+        #then queued to be made in the background
+        path = self.store.find(url, size)
+        if path is None:
+            self.queue(url)
+        return path
+
+    def queue(self, url):
+        jobs, _ = self._pools()
+        now = time.time()
+        with self.lock:
+            if url in self.pending or now - self.failed.get(url, 0) < RETRY_AGE:
+                return False
+            self.failed = {failed: at for failed, at in self.failed.items()
+                           if now - at < RETRY_AGE}
+            self.pending.add(url)
+        jobs.submit(self._make, url)
+        return True
+
+    def make(self, url):
+        #fetches and resizes url right away. Raises FetchError or the
+        #decoder's error for bad originals.
+        data = self.fetcher(url)
+        _, pool = self._pools()
+        thumbnails = pool.submit(resize, data, SIZES).result(self.timeout)
+        self.store.add(url, hashlib.sha256(data).hexdigest(), thumbnails)
+
+    def _make(self, url):
+        try:
+            self.make(url)
+        except Exception as e:
+            log.warning('no thumbnail for %s: %s', url, e)
+            with self.lock:
+                self.failed[url] = time.time()
+        finally:
+            with self.lock:
+                self.pending.discard(url)
+
+
+thumbnails = Blueprint('thumbnails', __name__, url_prefix='/thumbnails')
+
+
+@thumbnails.route('/<any(venue, artist):kind>/<int:entity_id>/<any(small, medium, large):size>')
+def thumbnail(kind, entity_id, size):
+    model = MODELS[kind]
+    image_link = db.session.query(model.image_link).filter(
+        model.id == entity_id).scalar()
+    if not image_link:
+        abort(404)
+    path = current_app.extensions['thumbnailer'].get(image_link, size)
+    if path is None:
+        #the original until the thumbnail is made
+        response = redirect(image_link)
+        response.headers['Cache-Control'] = 'public, max-age={}'.format(RETRY_AGE)
+        return response
+    response = send_file(path, conditional=True)
+    response.headers['Cache-Control'] = 'public, max-age={}, immutable'.format(MAX_AGE)
+    return response
+
+
+def thumbnail_url(kind, entity_id, image_link, size='medium'):
+    #where a template gets a thumbnail of image_link from
+    if not image_link or 'thumbnailer' not in current_app.extensions:
+        return image_link
+    return url_for('thumbnails.thumbnail', kind=kind, entity_id=entity_id, size=size,
+                   v=hashlib.sha256(image_link.encode('utf-8')).hexdigest()[:16])
+
+
+def init_thumbnails(app, fetcher=None):
+    app.jinja_env.globals['thumbnail_url'] = thumbnail_url
+    if not app.config['THUMBNAILS_ENABLED']:
+        return
+    if fetcher is None:
+        if app.config['THUMBNAIL_SOURCE_DIR']:
+            fetcher = FileFetcher(app.config['THUMBNAIL_SOURCE_DIR'])
+        else:
+            fetcher = HTTPFetcher(app.config['THUMBNAIL_FETCH_TIMEOUT'],
+                                  app.config['THUMBNAIL_MAX_SOURCE_BYTES'])
+    store = ThumbnailStore(os.path.join(app.root_path, app.config['THUMBNAIL_DIR']),
+                           app.config['THUMBNAIL_MAX_BYTES'])
+    app.extensions['thumbnailer'] = Thumbnailer(
+        store, fetcher, app.config['THUMBNAIL_WORKERS'],
+        app.config['THUMBNAIL_RESIZE_TIMEOUT'])
+    app.register_blueprint(thumbnails)